@@ -0,0 +1,74 @@
+"""
+    Micro benchmark of file hashing approaches and chunk sizes.
+
+    Compares the former 4 KiB read loop, readinto with a reused buffer of
+    several sizes, mmap and hash_files with several workers. Run with:
+    python benchmarks/file_hashing.py [size in MB] [number of files]
+"""
+import hashlib
+import mmap
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, 'src')
+
+from pytargetingutilities.tools.hash import file_digest, hash_files  # noqa: E402
+
+
+def read_loop(file_path, chunk_size=4096):
+    file_hash = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def mmap_digest(file_path):
+    with open(file_path, 'rb') as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped:
+        return hashlib.md5(mapped).hexdigest()
+
+
+def throughput(func, paths):
+    start = time.perf_counter()
+    func(paths)
+    seconds = time.perf_counter() - start
+    size = sum(os.path.getsize(path) for path in paths) / 1024 / 1024
+    return f'{size / seconds:10.0f} MB/s'
+
+
+if __name__ == '__main__':
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    file_count = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for idx in range(file_count):
+            paths.append(os.path.join(directory, f'{idx}.bin'))
+            with open(paths[-1], 'wb') as f:
+                for _ in range(size_mb):
+                    f.write(os.urandom(1024 * 1024))
+        print(f'{file_count} files of {size_mb} MB')
+        print(
+            'read loop   4 KiB',
+            throughput(lambda ps: [read_loop(p) for p in ps], paths),
+        )
+        for chunk_kb in [64, 256, 1024, 4096]:
+            print(
+                f'readinto {chunk_kb:>4} KiB',
+                throughput(
+                    lambda ps: [file_digest(p, chunk_size=chunk_kb * 1024) for p in ps],
+                    paths,
+                ),
+            )
+        print(
+            'mmap            ',
+            throughput(lambda ps: [mmap_digest(p) for p in ps], paths),
+        )
+        for workers in [1, 2, 4, 8]:
+            print(
+                f'hash_files {workers:>2} thr',
+                throughput(lambda ps: hash_files(ps, workers=workers), paths),
+            )
@@ -0,0 +1,73 @@
+"""
+    Benchmark of the listing filters of S3BasePaginator.date_paginator.
+
+    Times the JMESPath query that was replaced against the compiled
+    predicates of aws.s3.filters on synthetic listing pages of 1000 objects,
+    so no s3 access is needed. Run with:
+    python benchmarks/listing_filters.py
+"""
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import jmespath
+
+sys.path.insert(0, 'src')
+
+from pytargetingutilities.aws.s3.filters import (  # noqa: E402
+    all_of,
+    filter_pages,
+    modified_between,
+    suffix,
+)
+
+
+NOW = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+
+
+def generate_pages(count, page_size=1000):
+    items = [
+        {
+            'Key': f'data/2024/part-{idx:08}.{"json" if idx % 3 else "csv"}',
+            'LastModified': NOW - timedelta(hours=idx % 200),
+            'Size': idx,
+            'StorageClass': 'STANDARD',
+        }
+        for idx in range(count)
+    ]
+    return [
+        {'Contents': items[idx:idx + page_size]}
+        for idx in range(0, count, page_size)
+    ]
+
+
+def jmespath_filter(pages, max_date, ends_with):
+    filter_date = max_date.strftime('%Y-%m-%d %H:%M:%S')
+    expression = jmespath.compile(
+        f"Contents[?to_string(LastModified)>='\"{filter_date}\"'"
+        f" && ends_with(Key, `{ends_with}`)]"
+    )
+    for page in pages:
+        yield from expression.search(page) or []
+
+
+def predicate_filter(pages, max_date, ends_with):
+    predicate = all_of(modified_between(after=max_date), suffix(ends_with))
+    return filter_pages(pages, predicate)
+
+
+def timed(func, pages, max_date):
+    start = time.perf_counter()
+    matches = sum(1 for _ in func(pages, max_date, '.json'))
+    return time.perf_counter() - start, matches
+
+
+if __name__ == '__main__':
+    print(f'{"objects":>9} {"jmespath [obj/s]":>17} {"predicates [obj/s]":>19}')
+    for count in [10_000, 100_000, 500_000]:
+        pages = generate_pages(count)
+        max_date = NOW - timedelta(days=4, minutes=30)
+        legacy, legacy_matches = timed(jmespath_filter, pages, max_date)
+        compiled, matches = timed(predicate_filter, pages, max_date)
+        assert matches == legacy_matches
+        print(f'{count:>9} {count / legacy:17,.0f} {count / compiled:19,.0f}')
@@ -0,0 +1,64 @@
+"""
+    Benchmark of urltokenizer.relevant_tokens for a growing number of urls.
+
+    The quadratic implementation that was replaced is timed as reference up
+    to a few thousand urls. Run with:
+    python benchmarks/relevant_tokens.py
+"""
+import random
+import sys
+import time
+
+sys.path.insert(0, 'src')
+
+from pytargetingutilities.urltokenizer.regex_url_tokenizer import (  # noqa: E402
+    relevant_tokens,
+    tokens,
+)
+
+
+def legacy_relevant_tokens(urls):
+    urls_tokens = list(map(lambda x: tokens(x), urls))
+    all_tokens = [token for url_tokens in urls_tokens for token in url_tokens]
+    sorted_tokens = sorted(
+        [(x, all_tokens.count(x)) for x in set(all_tokens)],
+        key=lambda x: (x[1], len(x[0]), x[0]),
+        reverse=True,
+    )
+    result = set()
+    for url_tokens in urls_tokens:
+        for token, _ in sorted_tokens:
+            if token in url_tokens and not any(
+                val in url_tokens for val in result
+            ):
+                result.add(token)
+                break
+    return list(result)
+
+
+def generate_urls(count, seed=42):
+    rnd = random.Random(seed)
+    words = [f'word{idx}' for idx in range(max(count // 10, 50))]
+    return [
+        f'https://site{rnd.randint(0, count // 100)}.de/'
+        + '/'.join(rnd.choices(words, k=rnd.randint(1, 6)))
+        for _ in range(count)
+    ]
+
+
+def timed(func, urls):
+    start = time.perf_counter()
+    func(urls)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    print(f'{"urls":>8} {"indexed [s]":>12} {"legacy [s]":>12}')
+    for count in [1_000, 5_000, 20_000, 100_000, 300_000]:
+        urls = generate_urls(count)
+        legacy = (
+            f'{timed(legacy_relevant_tokens, urls):12.3f}'
+            if count <= 20_000
+            else f'{"-":>12}'
+        )
+        print(f'{count:>8} {timed(relevant_tokens, urls):12.3f} {legacy}')
@@ -0,0 +1,102 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+
+class ClientPool:
+    """
+    Thread safe registry of boto3 clients shared by all helpers.
+    Clients are created once per service, region and config options and
+    reused afterwards, so their HTTP connections stay warm. boto3 clients are
+    thread safe, only their creation is not, which is guarded by a lock.
+    Forked child processes start without clients, so they never share the
+    connections of their parent.
+    """
+
+    max_pool_connections = 50
+    retries = {'max_attempts': 5, 'mode': 'standard'}
+
+    _session = None
+    _clients = {}
+    _lock = threading.RLock()
+
+    @classmethod
+    def client(cls, service_name, region_name=None, **config):
+        """Returns the shared client of a service
+
+        Args:
+            service_name (str): aws service name e.g. s3, ec2 or ssm
+            region_name (str, optional): region of the client. Defaults to
+                the region of the session.
+            config: botocore config options that override the pool defaults
+                e.g. max_pool_connections
+
+        Returns:
+            botocore.client.BaseClient: client instance
+        """
+        key = (service_name, region_name, repr(sorted(config.items())))
+        client = cls._clients.get(key)
+        if client is not None:
+            return client
+        with cls._lock:
+            if key not in cls._clients:
+                cls._clients[key] = cls._get_session().client(
+                    service_name,
+                    region_name=region_name,
+                    config=cls._config(**config),
+                )
+            return cls._clients[key]
+
+    @classmethod
+    def configure(cls, max_pool_connections=None, retries=None, session=None):
+        """Changes the defaults of new clients and drops all cached clients
+
+        Args:
+            max_pool_connections (int, optional): http connections per client
+            retries (dict, optional): botocore retry config e.g.
+                {'max_attempts': 5, 'mode': 'standard'}
+            session (boto3.session.Session, optional): session that creates
+                the clients e.g. for tests or another profile
+        """
+        with cls._lock:
+            if max_pool_connections is not None:
+                cls.max_pool_connections = max_pool_connections
+            if retries is not None:
+                cls.retries = retries
+            if session is not None:
+                cls._session = session
+            cls._clients = {}
+
+    @classmethod
+    def reset(cls):
+        """Drops all cached clients and the session"""
+        with cls._lock:
+            cls._session = None
+            cls._clients = {}
+
+    @classmethod
+    def _after_fork(cls):
+        # the lock may have been held by another thread of the parent
+        cls._lock = threading.RLock()
+        cls._clients = {}
+
+    @classmethod
+    def _get_session(cls):
+        if cls._session is None:
+            cls._session = boto3.session.Session()
+        return cls._session
+
+    @classmethod
+    def _config(cls, **config):
+        options = {
+            'max_pool_connections': cls.max_pool_connections,
+            'retries': cls.retries,
+        }
+        options.update(config)
+        return Config(**options)
+
+
+if hasattr(os, 'register_at_fork'):  # not available on windows
+    os.register_at_fork(after_in_child=ClientPool._after_fork)
@@ -1,6 +1,7 @@
-import boto3
 import logging
 
+from pytargetingutilities.aws.client_pool import ClientPool
+
 
 class EC2Helper:
 
@@ -17,7 +18,7 @@ class EC2Helper:
         Returns:
             [Instance]: instance object
         """
-        instance = boto3.client('ec2').run_instances(
+        instance = ClientPool.client('ec2').run_instances(
             **instance_config,
             TagSpecifications=[
                 {
@@ -40,7 +41,7 @@ class EC2Helper:
         Args:
             instance_ids (List[str]):: list of instance ids
         """
-        waiter = boto3.client('ec2').get_waiter('instance_status_ok')
+        waiter = ClientPool.client('ec2').get_waiter('instance_status_ok')
         waiter.wait(InstanceIds=instance_ids)
 
     @staticmethod
@@ -50,7 +51,7 @@ class EC2Helper:
         Args:
             instance_ids (List[str]): list of instance ids
         """
-        boto3.client('ec2').terminate_instances(InstanceIds=instance_ids)
+        ClientPool.client('ec2').terminate_instances(InstanceIds=instance_ids)
 
     @staticmethod
     def create_image(instance_id, ami_name, ami_description):
@@ -64,7 +65,7 @@ class EC2Helper:
         Returns:
             Image: image object
         """
-        return boto3.client('ec2').create_image(
+        return ClientPool.client('ec2').create_image(
             InstanceId=instance_id, Name=ami_name, Description=ami_description
         )
 
@@ -78,7 +79,7 @@ class EC2Helper:
         Returns:
             bool: true if available otherwise false
         """
-        client = boto3.client('ec2')
+        client = ClientPool.client('ec2')
         waiter = client.get_waiter('image_available')
         waiter.wait(Filters=[{'Name': 'image-id', 'Values': [image_id]}])
         image = client.describe_images(ImageIds=[image_id])
@@ -98,7 +99,7 @@ class EC2Helper:
         Returns:
             bool: true if delete was successful otherwise false
         """
-        client = boto3.client('ec2')
+        client = ClientPool.client('ec2')
         images = client.describe_images(Owners=["self"])
         for image in images['Images']:
             if name == image['Name']:
@@ -120,7 +121,7 @@ class EC2Helper:
         Returns:
             bool: true if delete was successful otherwise false
         """
-        client = boto3.client('ec2')
+        client = ClientPool.client('ec2')
         EC2Helper.log.info(
             f'Deregister image {image_id}'
         )
@@ -154,7 +155,7 @@ class EC2Helper:
         Returns:
             list[str]: list of image ids
         """
-        client = boto3.client('ec2')
+        client = ClientPool.client('ec2')
         images = client.describe_images(Owners=['self'])['Images']
 
         if starts_with != '':
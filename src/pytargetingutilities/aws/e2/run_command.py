@@ -2,8 +2,7 @@ import time
 from concurrent.futures.thread import ThreadPoolExecutor
 from typing import List
 
-import boto3
-import botocore
+from pytargetingutilities.aws.client_pool import ClientPool
 
 
 class RunCommandEc2:
@@ -38,11 +37,9 @@ class RunCommandEc2:
     def _wait_for_result(
         command_id, ec2_ids, wait_for_invocation, waiter_args
     ):
-        waiter = boto3.client(
+        waiter = ClientPool.client(
             'ssm',
-            config=RunCommandEc2._create_config(
-                RunCommandEc2.max_pool_connections
-            ),
+            max_pool_connections=RunCommandEc2.max_pool_connections,
         ).get_waiter('command_executed')
         # we can only wait for one instance and to wait for all we need a pool
         with ThreadPoolExecutor(max_workers=len(waiter_args)) as executor:
@@ -60,11 +57,9 @@ class RunCommandEc2:
 
     @staticmethod
     def _get_command_invocation(command_id, ec2_ids, wait_for_invocation):
-        ssm_client = boto3.client(
+        ssm_client = ClientPool.client(
             'ssm',
-            config=RunCommandEc2._create_config(
-                RunCommandEc2.max_pool_connections
-            ),
+            max_pool_connections=RunCommandEc2.max_pool_connections,
         )
         # sleep prevents for InvocationDoesNotExist error
         time.sleep(wait_for_invocation)
@@ -80,11 +75,9 @@ class RunCommandEc2:
     def run_commands(
         instance_ids: List[str], commands: List[str], timeout_seconds=60 * 60
     ):
-        ssm_client = boto3.client(
+        ssm_client = ClientPool.client(
             'ssm',
-            config=RunCommandEc2._create_config(
-                RunCommandEc2.max_pool_connections
-            ),
+            max_pool_connections=RunCommandEc2.max_pool_connections,
         )
         response = ssm_client.send_command(
             InstanceIds=instance_ids,
@@ -93,9 +86,3 @@ class RunCommandEc2:
             Parameters={'commands': [' && '.join(commands)]},
         )
         return response
-
-    @staticmethod
-    def _create_config(max_pool_connections):
-        return botocore.config.Config(
-            max_pool_connections=max_pool_connections,
-        )
@@ -0,0 +1,187 @@
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from tempfile import NamedTemporaryFile as tmp
+from tempfile import mkstemp
+
+from pytargetingutilities.aws.client_pool import ClientPool
+from pytargetingutilities.aws.s3.multipart import MB, MultipartWriter
+
+
+async def iterate(iterator, batch_size=1):
+    """
+    Drive a blocking iterator on a background thread and yield its items.
+    The next batch of batch_size items is fetched while the consumer handles
+    the current one, so at most two batches are held in memory. When the
+    generator is closed or cancelled the iterator is closed as soon as its
+    running batch is done.
+
+    Args:
+        iterator (Iterable): blocking iterable e.g. S3Iterator
+        batch_size (int): number of items fetched per thread call
+    """
+    iterator = iter(iterator)
+    executor = ThreadPoolExecutor(max_workers=1)
+    pending = executor.submit(lambda: list(islice(iterator, batch_size)))
+    try:
+        while True:
+            batch = await asyncio.wrap_future(pending)
+            if not batch:
+                return
+            pending = executor.submit(
+                lambda: list(islice(iterator, batch_size))
+            )
+            for item in batch:
+                yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            pending.add_done_callback(lambda _: close())
+        executor.shutdown(wait=False)
+
+
+class AsyncS3Helper:
+    """
+    asyncio counterpart of S3Helper.read, download and write.
+    The blocking boto3 calls run on a thread pool of the shared clients; at
+    most max_concurrency operations run at the same time and further calls
+    wait for a free slot. Bodies are transferred in chunks of chunk_size with
+    one thread call per chunk, so a cancelled operation stops after its
+    current chunk: downloads leave no file behind and uploads are aborted.
+    """
+
+    def __init__(self, max_concurrency=16, chunk_size=MB):
+        """
+        Args:
+            max_concurrency (int): number of operations run concurrently
+            chunk_size (int): bytes transferred per thread call
+        """
+        self.max_concurrency = max_concurrency
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """ stop the thread pool, running operations are finished """
+        self._executor.shutdown(wait=False)
+
+    async def read(self, bucket_name, key):
+        """ returns the body of an s3 object """
+        async with self._slot():
+            chunks = []
+            await self._get(bucket_name, key, chunks.append)
+            return b''.join(chunks)
+
+    async def read_many(self, bucket_name, keys):
+        """
+        Yields (key, body) of all keys in the given order. Up to
+        max_concurrency bodies are read ahead of the consumer, further
+        reads wait until the consumer catches up.
+        """
+        keys = iter(keys)
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < self.max_concurrency:
+                    key = next(keys, None)
+                    if key is None:
+                        break
+                    task = asyncio.ensure_future(self.read(bucket_name, key))
+                    pending.append((key, task))
+                if not pending:
+                    return
+                key, task = pending.popleft()
+                yield key, await task
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+    async def download(self, bucket_name, key, destination):
+        """
+        Writes the body of an s3 object to destination. The body is written
+        to a hidden temporary file next to destination that replaces it at
+        the end, so readers never see a partially written file.
+        """
+        async with self._slot():
+            directory, name = os.path.split(os.path.abspath(destination))
+            fd, tmp_path = mkstemp(
+                dir=directory, prefix=f'.{name}.', suffix='.tmp'
+            )
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    await self._get(bucket_name, key, f.write)
+                os.replace(tmp_path, destination)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+    async def write(self, bucket, file_path, writer_func):
+        """
+        Like S3Helper.write: writer_func(path) writes a temporary file on
+        the thread pool, which is then uploaded to bucket/file_path.
+        """
+        async with self._slot():
+            with tmp() as map_file:
+                await self._run(writer_func, map_file.name)
+                writer = MultipartWriter(bucket, file_path, workers=1)
+                running = None
+                try:
+                    with open(map_file.name, 'rb') as source:
+                        while True:
+                            running = self._executor.submit(
+                                source.read, self.chunk_size
+                            )
+                            chunk = await asyncio.wrap_future(running)
+                            if not chunk:
+                                break
+                            running = self._executor.submit(
+                                writer.write, chunk
+                            )
+                            await asyncio.wrap_future(running)
+                    running = self._executor.submit(writer.close)
+                    await asyncio.wrap_future(running)
+                except BaseException:
+                    # abort once the running call of the writer is done
+                    if running is None:
+                        writer.abort()
+                    else:
+                        running.add_done_callback(lambda _: writer.abort())
+                    raise
+
+    def _slot(self):
+        # created on first use, so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _run(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, partial(func, *args, **kwargs)
+        )
+
+    async def _get(self, bucket_name, key, write):
+        response = await self._run(
+            ClientPool.client('s3').get_object, Bucket=bucket_name, Key=key
+        )
+        body = response['Body']
+
+        def copy_chunk():
+            chunk = body.read(self.chunk_size)
+            if chunk:
+                write(chunk)
+            return bool(chunk)
+
+        try:
+            while await self._run(copy_chunk):
+                pass
+        finally:
+            body.close()
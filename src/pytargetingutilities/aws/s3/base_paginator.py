@@ -1,12 +1,139 @@
-import boto3
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
+from pytargetingutilities.aws.client_pool import ClientPool
+from pytargetingutilities.aws.s3.filters import (
+    all_of,
+    filter_pages,
+    modified_between,
+    suffix,
+)
+
+_END = object()
+
+
+def _put(buffer, stop, entry):
+    """ put entry into buffer unless stop is set before there is space """
+    while not stop.is_set():
+        try:
+            buffer.put(entry, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def read_ahead(iterable, size):
+    """
+    Consume iterable on a background thread and buffer up to size items.
+    Exceptions of the producer are raised to the consumer; closing the
+    returned generator stops the producer.
+    """
+    buffer = queue.Queue(maxsize=size)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                if not _put(buffer, stop, (item, None)):
+                    return
+            _put(buffer, stop, (_END, None))
+        except Exception as ex:  # noqa: B902 - forwarded to the consumer
+            _put(buffer, stop, (_END, ex))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is _END:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def read_shards(shards, workers, ordered=True, size=4):
+    """
+    Consume several iterables concurrently on a pool of workers threads.
+    With ordered the items of the first shard are yielded first, then those
+    of the second shard and so on; shards ahead of the consumer buffer up to
+    size items each and wait. Without ordered the items are yielded as soon
+    as any shard produces them. Exceptions of a shard are raised to the
+    consumer; closing the returned generator stops all shards.
+    """
+    shards = list(shards)
+    stop = threading.Event()
+    if ordered:
+        buffers = [queue.Queue(maxsize=size) for _ in shards]
+    else:
+        buffers = [queue.Queue(maxsize=size * workers)] * len(shards)
+
+    def produce(shard, buffer):
+        if stop.is_set():
+            return
+        try:
+            for item in shard:
+                if not _put(buffer, stop, (item, None)):
+                    return
+            _put(buffer, stop, (_END, None))
+        except Exception as ex:  # noqa: B902 - forwarded to the consumer
+            _put(buffer, stop, (_END, ex))
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    # the pool starts the shards in order, so the shard the consumer waits
+    # for is always running
+    for shard, buffer in zip(shards, buffers):
+        executor.submit(produce, shard, buffer)
+    try:
+        done = 0
+        while done < len(shards):
+            item, error = buffers[done].get()
+            if error is not None:
+                raise error
+            if item is _END:
+                done += 1
+                continue
+            yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
+
 
 class S3BasePaginator(object):
-    def __init__(self, pages, meta):
+    def __init__(self, pages, meta, list_ahead=0):
+        """
+        Args:
+            pages: listing pages or items of the objects
+            meta (dict): bucket, max_items and directory of the listing
+            list_ahead (int): number of listed objects that are buffered by a
+                background listing thread; 0 lists pages on demand
+        """
         self._pages = pages
         self._meta = meta
         self._keys = []
+        self._list_ahead = list_ahead
+
+    def objects(self):
+        """ lazily yield the listing dicts (Key, Size, ETag, ...) of all objects """
+        return self._iter_items()
+
+    def _iter_items(self):
+        """ lazily yield the object dicts of all listing pages """
+        items = self._iter_page_items()
+        if self._list_ahead > 0:
+            items = read_ahead(items, self._list_ahead)
+        return items
+
+    def _iter_page_items(self):
+        for page in self._pages:
+            if 'Contents' in page:
+                yield from page['Contents']
+            elif 'Key' in page:
+                yield page
 
     @staticmethod
     def __paginator(bucket_name, directory, max_items, continuation_token):
@@ -21,12 +148,183 @@ class S3BasePaginator(object):
             cfg['ContinuationToken'] = continuation_token
 
         return (
-            boto3.client('s3').get_paginator('list_objects_v2').paginate(**cfg)
+            ClientPool.client('s3')
+            .get_paginator('list_objects_v2')
+            .paginate(**cfg)
+        )
+
+    @classmethod
+    def __pages(
+            cls,
+            bucket_name,
+            directory,
+            max_items,
+            continuation_token,
+            shards,
+            shard_workers,
+            ordered,
+    ):
+        if shards is None:
+            return cls.__paginator(
+                bucket_name, directory, max_items, continuation_token
+            )
+        if continuation_token:
+            raise ValueError('continuation_token can not be used with shards')
+        if shards == 'prefixes':
+            return cls.__prefix_pages(
+                bucket_name, directory or '', max_items, shard_workers, ordered
+            )
+        boundaries = sorted(set(shards))
+        return read_shards(
+            (
+                cls.__shard_pages(
+                    bucket_name, directory, max_items, start_after, stop_at
+                )
+                for start_after, stop_at in zip(
+                    [None] + boundaries, boundaries + [None]
+                )
+            ),
+            shard_workers,
+            ordered,
+        )
+
+    @classmethod
+    def __prefix_pages(
+            cls, bucket_name, directory, max_items, shard_workers, ordered
+    ):
+        """
+        Split a listing at the common prefixes (Delimiter /) below directory
+        and list the prefixes concurrently. Runs of objects directly below
+        directory are listed lazily as shards of their own between the
+        prefix shards, so the shards cover the listing in key order. Without
+        common prefixes the listing is not split.
+        """
+        shards, directory = cls.__discover_shards(
+            bucket_name, directory, max_items
+        )
+        if not any(kind == 'prefix' for kind, _, _ in shards):
+            yield from cls.__shard_pages(bucket_name, directory, max_items)
+            return
+        yield from read_shards(
+            (
+                cls.__shard_pages(bucket_name, name, max_items)
+                if kind == 'prefix'
+                else cls.__direct_pages(
+                    bucket_name, directory, max_items, name, stop_before
+                )
+                for kind, name, stop_before in shards
+            ),
+            shard_workers,
+            ordered,
         )
 
     @staticmethod
-    def __build_filter(filter_query):
-        return "Contents[?" + " && ".join(filter_query) + "]"
+    def __discover_shards(bucket_name, directory, max_items):
+        """
+        Returns the shards below directory as (kind, name, stop_before)
+        tuples in key order: ('prefix', prefix, None) for a common prefix
+        and ('direct', start_after, stop_before) for a run of objects
+        directly below directory, plus the directory that was split. Only
+        the shard boundaries are kept in memory, not the listed objects.
+        """
+        paginator = ClientPool.client('s3').get_paginator('list_objects_v2')
+        while True:
+            shards = []
+            pages = paginator.paginate(
+                Bucket=bucket_name,
+                Prefix=directory,
+                Delimiter='/',
+                PaginationConfig={'PageSize': max_items},
+            )
+            for page in pages:
+                entries = [
+                    (item['Key'], 'direct')
+                    for item in page.get('Contents', [])
+                ] + [
+                    (prefix['Prefix'], 'prefix')
+                    for prefix in page.get('CommonPrefixes', [])
+                ]
+                for name, kind in sorted(entries):
+                    if kind == 'prefix':
+                        shards.append(('prefix', name, None))
+                    elif not shards or shards[-1][0] != 'direct':
+                        start_after = shards[-1][1] if shards else None
+                        shards.append(('direct', start_after, None))
+            # descend until the listing splits into several shards
+            if len(shards) != 1 or shards[0][0] != 'prefix':
+                break
+            directory = shards[0][1]
+        # a run of direct objects ends at the next common prefix
+        for idx, (kind, name, _) in enumerate(shards[:-1]):
+            if kind == 'direct':
+                shards[idx] = (kind, name, shards[idx + 1][1])
+        return shards, directory
+
+    @staticmethod
+    def __direct_pages(
+            bucket_name, directory, max_items, start_after, stop_before
+    ):
+        """ pages of the objects directly below directory between
+        start_after and stop_before """
+        cfg = {
+            'Bucket': bucket_name,
+            'Delimiter': '/',
+            'PaginationConfig': {'PageSize': max_items},
+        }
+        if directory:
+            cfg['Prefix'] = directory
+        if start_after:
+            cfg['StartAfter'] = start_after
+        pages = (
+            ClientPool.client('s3')
+            .get_paginator('list_objects_v2')
+            .paginate(**cfg)
+        )
+        for page in pages:
+            contents = page.get('Contents', [])
+            if stop_before is not None and (
+                    any(c['Key'] >= stop_before for c in contents)
+                    or any(
+                        p['Prefix'] >= stop_before
+                        for p in page.get('CommonPrefixes', [])
+                    )
+            ):
+                yield {
+                    'Contents': [
+                        c for c in contents if c['Key'] < stop_before
+                    ]
+                }
+                return
+            yield {'Contents': contents}
+
+    @staticmethod
+    def __shard_pages(
+            bucket_name, directory, max_items, start_after=None, stop_at=None
+    ):
+        """ pages of the keys in (start_after, stop_at] below directory """
+        cfg = {
+            'Bucket': bucket_name,
+            'PaginationConfig': {'PageSize': max_items},
+        }
+        if directory:
+            cfg['Prefix'] = directory
+        if start_after:
+            cfg['StartAfter'] = start_after
+        pages = (
+            ClientPool.client('s3')
+            .get_paginator('list_objects_v2')
+            .paginate(**cfg)
+        )
+        for page in pages:
+            contents = page.get('Contents', [])
+            if stop_at is not None and contents and (
+                    contents[-1]['Key'] > stop_at
+            ):
+                yield {
+                    'Contents': [c for c in contents if c['Key'] <= stop_at]
+                }
+                return
+            yield page
 
     @classmethod
     def date_paginator(
@@ -37,28 +335,52 @@ class S3BasePaginator(object):
             directory=None,
             ends_with=None,
             continuation_token=None,
+            shards=None,
+            shard_workers=8,
+            ordered=True,
+            filters=(),
+            **kwargs,
     ):
-        pages = cls.__paginator(
-            bucket_name, directory, max_items, continuation_token
+        """
+        Args:
+            shards: None lists sequentially; 'prefixes' splits the listing at
+                the common prefixes (Delimiter /) below directory; a list of
+                keys splits it into the key ranges between them (StartAfter).
+                The shards are listed concurrently.
+            shard_workers (int): number of shards listed concurrently
+            ordered (bool): keep the key order of a sharded listing,
+                otherwise objects are returned as soon as any shard lists them
+            filters (Iterable[Callable], optional): predicates of
+                aws.s3.filters or own callables item -> bool, that all have
+                to pass besides max_age and ends_with
+        """
+        pages = cls.__pages(
+            bucket_name,
+            directory,
+            max_items,
+            continuation_token,
+            shards,
+            shard_workers,
+            ordered,
         )
-        filter_date = (
+        max_date = (
             datetime.utcnow().replace(tzinfo=timezone.utc)
             - timedelta(days=max_age)
-        ).strftime('%Y-%m-%d %H:%M:%S')
-        query_filters = [
-            f"to_string(LastModified)>='\"{filter_date}\"'"
-        ]
-        if ends_with:
-            query_filters.append(f"ends_with(Key, `{ends_with}`)")
-        querystr = cls.__build_filter(query_filters)
+        )
+        predicate = all_of(
+            modified_between(after=max_date),
+            suffix(ends_with) if ends_with else None,
+            *filters,
+        )
 
         return cls(
-            pages.search(querystr),
+            filter_pages(pages, predicate),
             meta={
                 'bucket': bucket_name,
                 'max_items': max_items,
                 'directory': directory,
             },
+            **kwargs,
         )
 
     @classmethod
@@ -69,19 +391,41 @@ class S3BasePaginator(object):
             directory=None,
             ends_with=None,
             continuation_token=None,
+            shards=None,
+            shard_workers=8,
+            ordered=True,
+            filters=(),
+            **kwargs,
     ):
-        pages = cls.__paginator(
-            bucket_name, directory, max_items, continuation_token
+        """
+        Args:
+            shards: None lists sequentially; 'prefixes' splits the listing at
+                the common prefixes (Delimiter /) below directory; a list of
+                keys splits it into the key ranges between them (StartAfter).
+                The shards are listed concurrently.
+            shard_workers (int): number of shards listed concurrently
+            ordered (bool): keep the key order of a sharded listing,
+                otherwise objects are returned as soon as any shard lists them
+            filters (Iterable[Callable], optional): predicates of
+                aws.s3.filters or own callables item -> bool, that all have
+                to pass besides ends_with
+        """
+        pages = cls.__pages(
+            bucket_name,
+            directory,
+            max_items,
+            continuation_token,
+            shards,
+            shard_workers,
+            ordered,
         )
-
-        if ends_with:
-            querystr = cls.__build_filter([f"ends_with(Key, `{ends_with}`)"])
-            pages = pages.search(querystr)
+        predicate = all_of(suffix(ends_with) if ends_with else None, *filters)
         return cls(
-            pages,
+            filter_pages(pages, predicate),
             meta={
                 'bucket': bucket_name,
                 'max_items': max_items,
                 'directory': directory,
             },
-        )
\ No newline at end of file
+            **kwargs,
+        )
@@ -0,0 +1,110 @@
+"""
+    Predicates over the listing dicts (Key, Size, LastModified, StorageClass,
+    ...) of s3 objects. Every function compiles its arguments once and
+    returns a plain callable item -> bool, so any other callable with this
+    signature can be used as user predicate. Combine them with all_of,
+    any_of and negate and pass them as filters to
+    S3BasePaginator.paginator / date_paginator.
+"""
+import fnmatch
+import re
+from datetime import timezone
+
+
+def prefix(*prefixes):
+    """ keys that start with one of prefixes """
+    if not prefixes:
+        raise ValueError('prefix needs at least one prefix')
+    return lambda item: item['Key'].startswith(prefixes)
+
+
+def suffix(*suffixes):
+    """ keys that end with one of suffixes """
+    if not suffixes:
+        raise ValueError('suffix needs at least one suffix')
+    return lambda item: item['Key'].endswith(suffixes)
+
+
+def regex(pattern, flags=0):
+    """ keys that contain a match of the regular expression pattern """
+    search = re.compile(pattern, flags).search
+    return lambda item: search(item['Key']) is not None
+
+
+def glob(pattern):
+    """ keys that match the shell pattern e.g. logs/*/part-*.gz """
+    match = re.compile(fnmatch.translate(pattern)).match
+    return lambda item: match(item['Key']) is not None
+
+
+def size_between(min_size=None, max_size=None):
+    """ objects with min_size <= Size <= max_size bytes """
+    min_size = 0 if min_size is None else min_size
+    max_size = float('inf') if max_size is None else max_size
+    return lambda item: min_size <= item['Size'] <= max_size
+
+
+def modified_between(after=None, before=None):
+    """
+    objects with after <= LastModified < before; naive datetimes are taken
+    as UTC. Without bounds None is returned, which all_of ignores.
+    """
+    after, before = _utc(after), _utc(before)
+    if after is None and before is None:
+        return None
+    if before is None:
+        return lambda item: item['LastModified'] >= after
+    if after is None:
+        return lambda item: item['LastModified'] < before
+    return lambda item: after <= item['LastModified'] < before
+
+
+def storage_class(*classes):
+    """ objects stored in one of classes e.g. STANDARD or GLACIER """
+    if not classes:
+        raise ValueError('storage_class needs at least one class')
+    classes = frozenset(classes)
+    return lambda item: item.get('StorageClass', 'STANDARD') in classes
+
+
+def all_of(*predicates):
+    """ items that pass all predicates, None entries are ignored """
+    predicates = tuple(p for p in predicates if p is not None)
+    if not predicates:
+        return None
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda item: all(p(item) for p in predicates)
+
+
+def any_of(*predicates):
+    """ items that pass at least one of predicates, None entries are ignored """
+    predicates = tuple(p for p in predicates if p is not None)
+    if not predicates:
+        return None
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda item: any(p(item) for p in predicates)
+
+
+def negate(predicate):
+    """ items that do not pass predicate; None stays None """
+    if predicate is None:
+        return None
+    return lambda item: not predicate(item)
+
+
+def filter_pages(pages, predicate=None):
+    """ lazily yield the object dicts of listing pages that pass predicate """
+    for page in pages:
+        contents = page.get('Contents', ())
+        if predicate is None:
+            yield from contents
+        else:
+            yield from filter(predicate, contents)
+
+
+def _utc(timestamp):
+    if timestamp is not None and timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
@@ -1,101 +1,440 @@
 import datetime as dt
+import io
 import json
 import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from tempfile import NamedTemporaryFile as tmp
+from tempfile import mkstemp
 
-import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 
+from pytargetingutilities.aws.client_pool import ClientPool
 from pytargetingutilities.aws.s3.iterator import S3Iterator
-from pytargetingutilities.tools.hash import md5, md5_str
+from pytargetingutilities.aws.s3.multipart import MB, MultipartWriter
+from pytargetingutilities.aws.s3.object_cache import ObjectCache
+from pytargetingutilities.tools.hash import HashingWriter, md5, s3_etag
 
 
 class S3Helper:
+    # opt-in tools.digest_cache.DigestCache for digests of local files
+    digest_cache = None
+    # used by all uploads of local files, etag() computes ETags for it
+    transfer_config = TransferConfig()
+    # (listing time, directory) of get_latest_directory_cached per bucket and prefix
+    _latest_directories = {}
+
     @staticmethod
-    def get_latest_directory(s3bucket, prefix='', region_name='eu-west-1'):
+    def get_latest_directory(
+        s3bucket, prefix='', region_name='eu-west-1', workers=1, delimiter='/'
+    ):
+        """Returns the directory of the most recently modified object below
+        prefix. All objects are listed but only the latest one is kept in
+        memory. With workers > 1 the listing is split into the common
+        prefixes below prefix (Delimiter listing), which are listed
+        concurrently.
+
+        Args:
+            s3bucket (str): name of the s3 bucket
+            prefix (str): prefix of the listed objects
+            region_name (str): region of the bucket
+            workers (int): number of partitions listed concurrently
+            delimiter (str): delimiter that splits the listing into partitions
+
+        Returns:
+            str: directory of the latest object or None if there is none
+        """
         if prefix is None:
             prefix = ''
-        s3_client = boto3.client('s3', region_name=region_name)
-        response = s3_client.list_objects_v2(Bucket=s3bucket, Prefix=prefix)
-        if 'Contents' not in response:
+        if workers > 1:
+            latest = S3Helper.__latest_parallel(
+                s3bucket, prefix, region_name, workers, delimiter
+            )
+        else:
+            latest = S3Helper.__latest_object(
+                S3Helper.__list(s3bucket, prefix, region_name)
+            )
+        if latest is None:
             return None
-        # Get the key of the object with the highest LastModified date
-        latest_object = max(
-            response['Contents'], key=lambda obj: obj['LastModified']
-        )['Key']
-        return os.path.dirname(latest_object)
+        return os.path.dirname(latest['Key'])
 
     @staticmethod
-    def merge_json(bucket, input_directory, output_directory, filename):
-        s3_paginator = S3Iterator.paginator(
-            bucket_name=bucket,
-            directory=input_directory,
-            ends_with='.json',
+    def get_latest_directory_cached(
+        s3bucket, prefix='', region_name='eu-west-1', ttl=60, **kwargs
+    ):
+        """get_latest_directory with results cached for ttl seconds, for
+        services that poll the latest directory often
+
+        Args:
+            s3bucket (str): name of the s3 bucket
+            prefix (str): prefix of the listed objects
+            region_name (str): region of the bucket
+            ttl (float): seconds a result is reused
+            kwargs: further get_latest_directory arguments e.g. workers
+
+        Returns:
+            str: directory of the latest object or None if there is none
+        """
+        key = (s3bucket, prefix, region_name)
+        now = time.monotonic()
+        cached = S3Helper._latest_directories.get(key)
+        if cached is not None and now - cached[0] < ttl:
+            return cached[1]
+        directory = S3Helper.get_latest_directory(
+            s3bucket, prefix, region_name, **kwargs
         )
+        S3Helper._latest_directories[key] = (now, directory)
+        return directory
+
+    @staticmethod
+    def clear_latest_directory_cache():
+        """Drops all results of get_latest_directory_cached"""
+        S3Helper._latest_directories.clear()
+
+    @staticmethod
+    def __latest_object(objects, latest=None):
+        """Running maximum of LastModified, the smaller key wins ties"""
+        for obj in objects:
+            if latest is None or (obj['LastModified'], latest['Key']) > (
+                latest['LastModified'], obj['Key']
+            ):
+                latest = obj
+        return latest
 
-        json_data = json.dumps(
-            dict(
-                (key, d[key])
-                for d in [json.loads(content) for content in s3_paginator]
-                for key in d
+    @staticmethod
+    def __latest_parallel(bucket, prefix, region_name, workers, delimiter):
+        paginator = ClientPool.client(
+            's3', region_name=region_name
+        ).get_paginator('list_objects_v2')
+        latest = None
+        while True:
+            partitions = []
+            pages = paginator.paginate(
+                Bucket=bucket, Prefix=prefix, Delimiter=delimiter
             )
-        )
+            for page in pages:
+                latest = S3Helper.__latest_object(
+                    page.get('Contents', []), latest
+                )
+                partitions.extend(
+                    p['Prefix'] for p in page.get('CommonPrefixes', [])
+                )
+            # descend until the listing splits into several partitions
+            if latest is not None or len(partitions) != 1:
+                break
+            prefix = partitions[0]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                lambda partition: S3Helper.__latest_object(
+                    S3Helper.__list(bucket, partition, region_name)
+                ),
+                partitions,
+            )
+            for result in results:
+                if result is not None:
+                    latest = S3Helper.__latest_object([result], latest)
+        return latest
 
-        hash_str = md5_str(json_data)
+    @staticmethod
+    def merge_json(
+        bucket,
+        input_directory,
+        output_directory,
+        filename,
+        workers=16,
+        output_bucket='crtt-batch',
+    ):
+        """Merges all json objects of input_directory into one json object
+        in output_bucket. Keys of later objects (in key order) win and keep
+        the position of their first occurrence. The merged object and its
+        md5 file are written to output_directory. All other objects of
+        output_directory are deleted once the merged object is complete, so
+        a failed merge keeps the previous output.
 
-        boto3.resource('s3').Bucket('crtt-batch').objects.filter(
-            Prefix=f'{output_directory}'
-        ).delete()
+        The inputs are downloaded concurrently and merged one by one in key
+        order. The merged object is streamed into a multipart upload and
+        hashed on the same pass.
 
-        s3 = boto3.client('s3')
-        s3.put_object(
-            Bucket='crtt-batch',
-            Key=f'{output_directory}{filename}',
-            Body=json_data.encode(),
+        Args:
+            bucket (str): bucket of the input objects
+            input_directory (str): prefix of the input objects
+            output_directory (str): prefix of the output, must end with /
+            filename (str): name of the merged object
+            workers (int): number of inputs fetched concurrently
+            output_bucket (str): bucket of the merged object
+        """
+        if not output_directory.endswith('/'):
+            raise AttributeError('Prefix must end with /')
+        contents = S3Iterator.paginator(
+            bucket_name=bucket,
+            directory=input_directory,
+            ends_with='.json',
+            prefetch=workers,
+            workers=workers,
         )
 
-        s3.put_object(
-            Bucket='crtt-batch',
+        stale = [
+            obj['Key']
+            for obj in S3Helper.__list(output_bucket, output_directory)
+        ]
+
+        merged = {}
+        for content in contents:
+            merged.update(json.loads(content))
+        with MultipartWriter(
+            output_bucket, f'{output_directory}{filename}'
+        ) as writer:
+            writer.write(b'{')
+            for index, (key, value) in enumerate(merged.items()):
+                item = f'{json.dumps(key)}: {json.dumps(value)}'
+                writer.write((', ' if index else '').encode())
+                writer.write(item.encode())
+            writer.write(b'}')
+
+        ClientPool.client('s3').put_object(
+            Bucket=output_bucket,
             Key=f'{output_directory}{filename}.md5',
-            Body=hash_str.encode(),
+            Body=writer.hexdigest().encode(),
+        )
+        written_keys = {
+            f'{output_directory}{filename}',
+            f'{output_directory}{filename}.md5',
+        }
+        S3Helper.__delete_keys(
+            output_bucket, [key for key in stale if key not in written_keys]
         )
 
     @staticmethod
     def write_with_hash(
-        bucket, file_path, writer_func, hash_check: bool = False
+        bucket,
+        file_path,
+        writer_func,
+        hash_check: bool = False,
+        hash_mode='sidecar',
     ):
-        with tmp() as map_file, tmp() as hash_file:
+        """Writes a file with writer_func and uploads it with its md5 digest.
+        Without hash_check the digest is computed while the file is uploaded,
+        so it is read only once; see write_stream_with_hash to hash it while
+        writer_func writes.
+
+        Args:
+            bucket (str): target bucket
+            file_path (str): target key
+            writer_func (Callable): function that writes the content to the
+                given path
+            hash_check (bool): skip the upload if the digest did not change
+            hash_mode (str): sidecar stores the digest in <file_path>.md5,
+                metadata stores it as md5 metadata of the object itself
+
+        Returns:
+            bool: whether the file was written
+        """
+        S3Helper.__check_hash_mode(hash_mode)
+        with tmp() as map_file:
             writer_func(map_file.name)
-            myhash = md5(map_file.name)
-            if hash_check and S3Helper.__hash_check(bucket, file_path, myhash):
-                return False
-            hash_file.write(myhash.encode())
-            hash_file.flush()
-            S3Helper.__write(map_file.name, bucket, file_path)
-            S3Helper.__write(hash_file.name, bucket, f'{file_path}.md5')
+            if hash_check or hash_mode == 'metadata':
+                # the digest decides about the upload, so it is read first
+                myhash = md5(map_file.name)
+                if hash_check and S3Helper.__hash_check(
+                    bucket, file_path, myhash, hash_mode
+                ):
+                    return False
+                S3Helper.__write_with_digest(
+                    map_file.name, bucket, file_path, myhash, hash_mode
+                )
+                return True
+            # the file is read once, hashed while it is uploaded
+            with open(map_file.name, 'rb') as source:
+                with MultipartWriter(bucket, file_path) as writer:
+                    shutil.copyfileobj(source, writer, MB)
+            S3Helper.__put_digest(bucket, file_path, writer.hexdigest())
+            return True
+
+    @staticmethod
+    def write_stream_with_hash(
+        bucket,
+        file_path,
+        writer_func,
+        hash_check: bool = False,
+        text=False,
+        hash_mode='sidecar',
+    ):
+        """Like write_with_hash, but writer_func(file) writes to a file object
+        and the md5 digest is computed while it writes.
+
+        Without hash_check the output is streamed into a multipart upload
+        that runs while writer_func is still producing data, no temporary
+        file is written. With hash_check (or hash_mode metadata, since the
+        digest must be known before the upload starts) the output is written
+        to a temporary file first, which is only uploaded if the digest
+        changed.
+
+        Args:
+            bucket (str): target bucket
+            file_path (str): target key
+            writer_func (Callable): function that writes the content to the
+                given file object
+            hash_check (bool): skip the upload if the digest did not change
+            text (bool): pass a utf-8 text file instead of a binary file
+            hash_mode (str): sidecar or metadata, see write_with_hash
+
+        Returns:
+            bool: whether the file was written
+        """
+        S3Helper.__check_hash_mode(hash_mode)
+        if hash_check or hash_mode == 'metadata':
+            with tmp() as map_file:
+                hashing_file = HashingWriter(map_file)
+                with S3Helper.__writer_file(hashing_file, text) as f:
+                    writer_func(f)
+                map_file.flush()
+                myhash = hashing_file.hexdigest()
+                if hash_check and S3Helper.__hash_check(
+                    bucket, file_path, myhash, hash_mode
+                ):
+                    return False
+                S3Helper.__write_with_digest(
+                    map_file.name, bucket, file_path, myhash, hash_mode
+                )
             return True
+        with MultipartWriter(bucket, file_path) as writer:
+            with S3Helper.__writer_file(writer, text) as f:
+                writer_func(f)
+        S3Helper.__put_digest(bucket, file_path, writer.hexdigest())
+        return True
+
+    @staticmethod
+    def hash_check_stream(
+        bucket, file_path, writer_func, text=False, hash_mode='sidecar'
+    ):
+        """Returns true if hash of file on s3 has not changed. writer_func
+        writes to a file object that only hashes, nothing is stored."""
+        hashing_file = HashingWriter()
+        with S3Helper.__writer_file(hashing_file, text) as f:
+            writer_func(f)
+        return S3Helper.__hash_check(
+            bucket, file_path, hashing_file.hexdigest(), hash_mode
+        )
+
+    @staticmethod
+    @contextmanager
+    def __writer_file(binary_file, text):
+        if not text:
+            yield binary_file
+            return
+        text_file = io.TextIOWrapper(binary_file, encoding='utf-8')
+        try:
+            yield text_file
+        finally:
+            text_file.detach()  # flushes, the binary file stays open
+
+    @staticmethod
+    def __check_hash_mode(hash_mode):
+        if hash_mode not in ('sidecar', 'metadata'):
+            raise ValueError(f'Unknown hash_mode {hash_mode}')
 
     @staticmethod
-    def __hash_check(bucket, file_path, file_hash):
+    def __hash_check(bucket, file_path, file_hash, hash_mode='sidecar'):
         """Returns true if hash has not changed"""
+        S3Helper.__check_hash_mode(hash_mode)
+        if hash_mode == 'metadata':
+            return S3Helper.__metadata_hash_check(bucket, file_path, file_hash)
         # be agnostic whether file or its md5 file is in file_path
         file_path.rstrip(".md5")
         try:
-            if S3Helper.read(bucket, f'{file_path}.md5') == file_hash:
-                return True
-            return False
+            stored_hash = S3Helper.read(bucket, f'{file_path}.md5')
+            return stored_hash.decode('utf-8') == file_hash
         except ClientError as ex:
             if ex.response['Error']['Code'] == 'NoSuchKey':
                 return False
             raise
 
     @staticmethod
-    def hash_check(bucket, file_path, writer_func):
+    def __metadata_hash_check(bucket, key, file_hash):
+        """Compares the md5 metadata of the object, or its ETag for objects
+        that were uploaded in one part, with a single head_object"""
+        try:
+            head = ClientPool.client('s3').head_object(Bucket=bucket, Key=key)
+        except ClientError as ex:
+            if ex.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        if 'md5' in head.get('Metadata', {}):
+            return head['Metadata']['md5'] == file_hash
+        etag = head['ETag'].strip('"')
+        return '-' not in etag and etag == file_hash
+
+    @staticmethod
+    def hash_check_many(bucket, file_hashes, hash_mode='sidecar', workers=16):
+        """Checks many keys concurrently
+
+        Args:
+            bucket (str): bucket of the objects
+            file_hashes (dict): local md5 digest by key
+            hash_mode (str): sidecar or metadata, see write_with_hash
+            workers (int): number of concurrent checks
+
+        Returns:
+            dict: true by key if the hash of the object has not changed
+        """
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                lambda item: S3Helper.__hash_check(
+                    bucket, item[0], item[1], hash_mode
+                ),
+                file_hashes.items(),
+            )
+            return dict(zip(file_hashes, results))
+
+    @staticmethod
+    def hash_check(bucket, file_path, writer_func, hash_mode='sidecar'):
         """Returns true if hash of file on s3 has not changed"""
         with tmp() as map_file:
             writer_func(map_file.name)
             myhash = md5(map_file.name)
-            return S3Helper.__hash_check(bucket, file_path, myhash)
+            return S3Helper.__hash_check(bucket, file_path, myhash, hash_mode)
+
+    @staticmethod
+    def upload_with_hash(
+        bucket,
+        file_path,
+        local_path,
+        hash_check: bool = False,
+        hash_mode='sidecar',
+    ):
+        """Uploads an existing local file together with its md5 digest.
+        The digest is taken from S3Helper.digest_cache if set, so unchanged
+        files are not read again.
+
+        Args:
+            bucket (str): target bucket
+            file_path (str): target key
+            local_path (str): path of the local file
+            hash_check (bool): skip the upload if the digest did not change
+            hash_mode (str): sidecar or metadata, see write_with_hash
+
+        Returns:
+            bool: whether the file was written
+        """
+        myhash = md5(local_path, cache=S3Helper.digest_cache)
+        if hash_check and S3Helper.__hash_check(
+            bucket, file_path, myhash, hash_mode
+        ):
+            return False
+        S3Helper.__write_with_digest(
+            local_path, bucket, file_path, myhash, hash_mode
+        )
+        return True
+
+    @staticmethod
+    def file_hash_check(bucket, file_path, local_path, hash_mode='sidecar'):
+        """Returns true if hash of file on s3 equals the hash of the local
+        file, using S3Helper.digest_cache if set"""
+        myhash = md5(local_path, cache=S3Helper.digest_cache)
+        return S3Helper.__hash_check(bucket, file_path, myhash, hash_mode)
 
     @staticmethod
     def write(bucket, file_path, writer_func):
@@ -104,12 +443,84 @@ class S3Helper:
             S3Helper.__write(map_file.name, bucket, file_path)
 
     @staticmethod
-    def __write(file_name, bucket, key):
-        boto3.resource('s3').meta.client.upload_file(file_name, bucket, key)
+    def __write(file_name, bucket, key, metadata=None):
+        extra_args = {'Metadata': metadata} if metadata else None
+        ClientPool.client('s3').upload_file(
+            file_name,
+            bucket,
+            key,
+            ExtraArgs=extra_args,
+            Config=S3Helper.transfer_config,
+        )
+
+    @staticmethod
+    def etag(local_path):
+        """Returns the ETag (without quotes) s3 assigns to the local file
+        when it is uploaded by S3Helper, or None if it does not exist.
+        Uses S3Helper.digest_cache if set."""
+        config = S3Helper.transfer_config
+        etag_of = lambda path: s3_etag(  # noqa: E731
+            path, config.multipart_threshold, config.multipart_chunksize
+        )
+        if S3Helper.digest_cache is None:
+            return etag_of(local_path)
+        return S3Helper.digest_cache.digest(
+            local_path,
+            f's3etag-{config.multipart_threshold}-{config.multipart_chunksize}',
+            etag_of,
+        )
+
+    @staticmethod
+    def __write_with_digest(file_name, bucket, key, file_hash, hash_mode):
+        S3Helper.__check_hash_mode(hash_mode)
+        if hash_mode == 'metadata':
+            S3Helper.__write(file_name, bucket, key, {'md5': file_hash})
+            return
+        S3Helper.__write(file_name, bucket, key)
+        S3Helper.__put_digest(bucket, key, file_hash)
+
+    @staticmethod
+    def __put_digest(bucket, key, file_hash):
+        ClientPool.client('s3').put_object(
+            Bucket=bucket, Key=f'{key}.md5', Body=file_hash.encode()
+        )
+
+    @staticmethod
+    def __delete_prefix(bucket, prefix):
+        """Deletes all objects below prefix"""
+        S3Helper.__delete_keys(
+            bucket, [obj['Key'] for obj in S3Helper.__list(bucket, prefix)]
+        )
+
+    @staticmethod
+    def __delete_keys(bucket, keys):
+        """Deletes the given keys, 1000 keys per request"""
+        s3 = ClientPool.client('s3')
+        for idx in range(0, len(keys), 1000):
+            s3.delete_objects(
+                Bucket=bucket,
+                Delete={
+                    'Objects': [{'Key': key} for key in keys[idx:idx + 1000]],
+                    'Quiet': True,
+                },
+            )
+
+    @staticmethod
+    def __list(bucket, prefix, region_name=None):
+        """Yields the listing dicts of all objects below prefix"""
+        pages = (
+            ClientPool.client('s3', region_name=region_name)
+            .get_paginator('list_objects_v2')
+            .paginate(Bucket=bucket, Prefix=prefix)
+        )
+        for page in pages:
+            yield from page.get('Contents', [])
 
     @staticmethod
     def read(bucket_name, key):
-        s3 = boto3.client('s3')
+        if ObjectCache.default is not None:
+            return ObjectCache.default.read(bucket_name, key)
+        s3 = ClientPool.client('s3')
         data = s3.get_object(Bucket=bucket_name, Key=key)
         return data['Body'].read()
 
@@ -127,19 +538,140 @@ class S3Helper:
         Returns:
             None - content of object is written to file
         """
-        s3 = boto3.resource('s3')
-        s3.Object(bucket_name, key).download_file(destination)
+        S3Helper.__download_atomic(bucket_name, key, destination)
+
+    @staticmethod
+    @contextmanager
+    def __atomic_file(destination):
+        """Yields a hidden temporary file next to destination that replaces
+        destination when the block exits, so readers never see a partially
+        written file"""
+        directory, name = os.path.split(os.path.abspath(destination))
+        fd, tmp_path = mkstemp(dir=directory, prefix=f'.{name}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                yield f
+            os.replace(tmp_path, destination)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def __download_atomic(bucket_name, key, destination, config=None):
+        with S3Helper.__atomic_file(destination) as f:
+            ClientPool.client('s3').download_fileobj(
+                bucket_name,
+                key,
+                f,
+                Config=config or S3Helper.transfer_config,
+            )
+
+    @staticmethod
+    def __parallel_transfer_config(workers):
+        """transfer_config for workers concurrent transfers; the parts of
+        one file share the client connection pool with the other files"""
+        return TransferConfig(
+            multipart_threshold=S3Helper.transfer_config.multipart_threshold,
+            multipart_chunksize=S3Helper.transfer_config.multipart_chunksize,
+            max_concurrency=max(
+                1, ClientPool.max_pool_connections // max(workers, 1)
+            ),
+        )
+
+    @staticmethod
+    def download_directory(
+        bucket_name, prefix, local_directory, workers=8, only_newer=True
+    ):
+        """Mirrors all objects below prefix into local_directory.
+        The prefix is listed once and the objects are downloaded
+        concurrently, each into a temporary file that is renamed when it is
+        complete. The modification time of downloaded files is set to the
+        LastModified date of their object.
+
+        Keys whose path would end up outside of local_directory (e.g.
+        containing ..) are not downloaded but reported as rejected.
+
+        Args:
+            bucket_name (str): name of the s3 bucket
+            prefix (str): prefix of the objects, must be empty or end with /;
+                the rest of the key is the path relative to local_directory
+            local_directory (str): target directory, created if missing
+            workers (int): number of concurrent downloads
+            only_newer (bool): skip files with the size of the object and
+                either its modification time or its ETag
+
+        Returns:
+            dict: downloaded, skipped and rejected keys plus downloaded_bytes
+            and skipped_bytes
+        """
+        if prefix and not prefix.endswith('/'):
+            raise AttributeError('Prefix must end with /')
+        root = os.path.realpath(local_directory)
+
+        def destination(obj):
+            relative = obj['Key'][len(prefix):]
+            return os.path.realpath(os.path.join(root, *relative.split('/')))
+
+        objects = []
+        rejected = []
+        for obj in S3Helper.__list(bucket_name, prefix):
+            if obj['Key'].endswith('/'):
+                continue
+            path = destination(obj)
+            if path != root and os.path.commonpath([root, path]) == root:
+                objects.append(obj)
+            else:
+                rejected.append(obj['Key'])
+
+        def up_to_date(obj):
+            path = destination(obj)
+            if not os.path.isfile(path) or os.path.getsize(path) != obj['Size']:
+                return False
+            if int(os.path.getmtime(path)) == int(obj['LastModified'].timestamp()):
+                return True
+            return S3Helper.etag(path) == obj['ETag'].strip('"')
+
+        def download(obj):
+            path = destination(obj)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            S3Helper.__download_atomic(bucket_name, obj['Key'], path, config)
+            mtime = obj['LastModified'].timestamp()
+            os.utime(path, (mtime, mtime))
+
+        config = S3Helper.__parallel_transfer_config(workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            skip = (
+                list(executor.map(up_to_date, objects))
+                if only_newer
+                else [False] * len(objects)
+            )
+            downloads = [obj for obj, s in zip(objects, skip) if not s]
+            list(executor.map(download, downloads))
+        skipped = [obj for obj, s in zip(objects, skip) if s]
+        return {
+            'downloaded': [obj['Key'] for obj in downloads],
+            'skipped': [obj['Key'] for obj in skipped],
+            'rejected': rejected,
+            'downloaded_bytes': sum(obj['Size'] for obj in downloads),
+            'skipped_bytes': sum(obj['Size'] for obj in skipped),
+        }
 
     @staticmethod
     def download_latest(
             bucket_name: str,
             key: str,
             destination: str,
-            timestamp: dt.datetime
+            timestamp: dt.datetime,
+            skip_unchanged: bool = False,
     ) -> bool:
         """
         Writes content of s3 object to file, if age of object is younger than
-        timestamp
+        timestamp.
+        The object is fetched with a single conditional GET (If-Modified-Since),
+        so an object that is not newer only costs a 304 response. The ETag of
+        the written object is recorded next to destination; with
+        skip_unchanged an object whose ETag equals the recorded one is not
+        written again, which costs one additional HEAD request.
 
         Args:
             bucket_name (str): name of the s3 bucket
@@ -147,14 +679,55 @@ class S3Helper:
             destination (str): path of file
             timestamp (datetime): timestamp against which the age of the
                 object is compared
+            skip_unchanged (bool): also skip objects that are newer than
+                timestamp but were already written to destination
 
         Returns:
             bool: whether file was written
         """
-        if S3Helper.object_newer_than(bucket_name, key, timestamp):
-            S3Helper.download(bucket_name, key, destination)
-            return True
-        return False
+        client = ClientPool.client('s3')
+        state_path = S3Helper.__state_path(destination)
+        state = S3Helper.__read_state(state_path) if skip_unchanged else None
+        if state and os.path.exists(destination):
+            head = client.head_object(Bucket=bucket_name, Key=key)
+            if head['ETag'] == state['etag']:
+                return False
+        try:
+            response = client.get_object(
+                Bucket=bucket_name, Key=key, IfModifiedSince=timestamp
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('304', 'NotModified'):
+                return False
+            raise
+        body = response['Body']
+        # http dates have no sub-second precision, so the strict check of
+        # object_newer_than is repeated here
+        if response['LastModified'] <= timestamp:
+            body.close()
+            return False
+        with S3Helper.__atomic_file(destination) as f:
+            for chunk in body.iter_chunks():
+                f.write(chunk)
+        with S3Helper.__atomic_file(state_path) as f:
+            f.write(json.dumps({
+                'etag': response['ETag'],
+                'last_modified': response['LastModified'].isoformat(),
+            }).encode())
+        return True
+
+    @staticmethod
+    def __state_path(destination):
+        directory, name = os.path.split(os.path.abspath(destination))
+        return os.path.join(directory, f'.{name}.s3state')
+
+    @staticmethod
+    def __read_state(state_path):
+        try:
+            with open(state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
 
     @staticmethod
     def object_newer_than(
@@ -172,13 +745,20 @@ class S3Helper:
         Returns:
             bool: True if object is younger, else false
         """
-        s3 = boto3.resource('s3')
-        last_modified = s3.Object(bucket_name, key).last_modified
+        last_modified = ClientPool.client('s3').head_object(
+            Bucket=bucket_name, Key=key
+        )['LastModified']
         return last_modified > timestamp
 
     @staticmethod
     def upload_filtered_directory(
-        bucket, prefix, local_directory, extension, delete_existing
+        bucket,
+        prefix,
+        local_directory,
+        extension,
+        delete_existing,
+        sync=False,
+        workers=8,
     ):
         """Uploads local directory to s3 bucket.
         The local directory is filtered by given extension
@@ -190,18 +770,34 @@ class S3Helper:
             extension (str): filter for local directory. If you want to upload only
             wheel packages set extension to .whl
             delete_existing (bool): deletes target directory if set to true
+            sync (bool): upload only new or changed files, see sync_directory;
+                with delete_existing only stale keys are deleted
+            workers (int): number of concurrent uploads in sync mode
+
+        Returns:
+            dict: report of sync_directory in sync mode, else None
         """
         if not prefix.endswith('/'):
             raise AttributeError('Prefix must end with /')
-        s3 = boto3.resource('s3')
+        if sync:
+            return S3Helper.sync_directory(
+                bucket,
+                prefix,
+                local_directory,
+                extension,
+                delete_stale=delete_existing,
+                workers=workers,
+            )
+        s3 = ClientPool.client('s3')
         if delete_existing:
-            s3.Bucket(bucket).objects.filter(Prefix=prefix).delete()
+            S3Helper.__delete_prefix(bucket, prefix)
         list(
             map(
-                lambda local_file: s3.meta.client.upload_file(
+                lambda local_file: s3.upload_file(
                     os.path.join(local_directory, local_file),
                     bucket,
                     f'{prefix}{local_file}',
+                    Config=S3Helper.transfer_config,
                 ),
                 filter(
                     lambda x: x.endswith(extension),
@@ -209,3 +805,73 @@ class S3Helper:
                 ),
             )
         )
+
+    @staticmethod
+    def sync_directory(
+        bucket,
+        prefix,
+        local_directory,
+        extension='',
+        delete_stale=True,
+        workers=8,
+    ):
+        """Incrementally uploads a local directory tree to s3.
+        The prefix is listed once; files whose size and ETag match the
+        existing object are skipped, new or changed files are uploaded
+        concurrently and keys without a local file are batch deleted.
+
+        Args:
+            bucket (str): s3 target bucket
+            prefix (str): s3 upload location. Prefix must end with /
+            local_directory (str): local directory, subdirectories are
+                uploaded as key prefixes
+            extension (str): only files with this extension are synced
+            delete_stale (bool): delete keys below prefix without local file
+            workers (int): number of concurrent uploads
+
+        Returns:
+            dict: uploaded, skipped and deleted files plus uploaded_bytes and
+            skipped_bytes
+        """
+        if not prefix.endswith('/'):
+            raise AttributeError('Prefix must end with /')
+        remote = {obj['Key']: obj for obj in S3Helper.__list(bucket, prefix)}
+        local = {}
+        for root, _, files in os.walk(local_directory):
+            for name in files:
+                if not name.endswith(extension):
+                    continue
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, local_directory)
+                local[prefix + relative.replace(os.sep, '/')] = path
+
+        def changed(item):
+            key, path = item
+            obj = remote.get(key)
+            return obj is None or not (
+                obj['Size'] == os.path.getsize(path)
+                and obj['ETag'].strip('"') == S3Helper.etag(path)
+            )
+
+        transfer_config = S3Helper.__parallel_transfer_config(workers)
+        s3 = ClientPool.client('s3')
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            is_changed = dict(zip(local, executor.map(changed, local.items())))
+            uploads = [key for key in local if is_changed[key]]
+            list(executor.map(
+                lambda key: s3.upload_file(
+                    local[key], bucket, key, Config=transfer_config
+                ),
+                uploads,
+            ))
+        stale = [key for key in remote if key not in local]
+        if delete_stale:
+            S3Helper.__delete_keys(bucket, stale)
+        skipped = [key for key in local if not is_changed[key]]
+        return {
+            'uploaded': uploads,
+            'skipped': skipped,
+            'deleted': stale if delete_stale else [],
+            'uploaded_bytes': sum(os.path.getsize(local[k]) for k in uploads),
+            'skipped_bytes': sum(remote[k]['Size'] for k in skipped),
+        }
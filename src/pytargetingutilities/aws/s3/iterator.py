@@ -1,35 +1,101 @@
-import boto3
-from datetime import datetime, timedelta, timezone
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from pytargetingutilities.aws.client_pool import ClientPool
+from pytargetingutilities.aws.s3.aio import iterate
 from pytargetingutilities.aws.s3.base_paginator import S3BasePaginator
+from pytargetingutilities.aws.s3.object_cache import ObjectCache
+from pytargetingutilities.tools.codec import decompress_stream
+
 
 class S3Iterator(S3BasePaginator):
+    """
+    An iterator over the decoded bodies of all listed s3 objects.
+    Listing pages are requested on demand while iterating, so memory does not
+    grow with the number of objects; with list_ahead > 0 the listing runs on
+    a background thread and overlaps with the downloads.
+    With prefetch > 0 the bodies are downloaded on a thread pool ahead of the
+    consumer. At most prefetch bodies are held in memory and they are still
+    returned in key order; an error raised while downloading an object is
+    raised when the consumer reaches that object.
+    Compressed objects (gzip, bz2 or zstd) are decompressed transparently.
+    Bodies are read from ObjectCache.default if it is set.
+    async for runs the iteration on a background thread, so prefetch also
+    bounds the concurrency and memory of asynchronous consumers.
+    """
 
-    def __init__(self, pages, meta):
+    def __init__(
+        self, pages, meta, prefetch=0, workers=None, list_ahead=0
+    ):
         self._ctx = 0
-        super(S3Iterator,self).__init__(pages, meta)
+        self._items = None
+        self._prefetch = prefetch
+        self._workers = workers or prefetch
+        self._executor = None
+        self._pending = deque()
+        super(S3Iterator, self).__init__(pages, meta, list_ahead)
 
     def __iter__(self):
-        for page in self._pages:
-            if 'Contents' in page:
-                for item in page['Contents']:
-                    self._keys.append(item)
-            else:
-                self._keys.append(page)
+        if self._items is None:
+            self._items = self._iter_items()
         return self
 
+    def __aiter__(self):
+        return iterate(self)
+
     def __next__(self):
-        if self._ctx >= len(self._keys):
-            raise StopIteration
-        result = (
-            boto3.resource('s3')
-            .Object(self._meta['bucket'], self._keys[self._ctx]['Key'])
-            .get()['Body']
-            .read()
-            .decode('utf-8')
-            .strip()
-        )
+        iter(self)
+        if self._prefetch > 0:
+            return self._next_prefetched()
+        item = next(self._items)
         self._ctx += 1
-        return result
+        return self._fetch(item['Key'], item.get('ETag'))
+
+    def _next_prefetched(self):
+        self._fill_pending()
+        if not self._pending:
+            self.close()
+            raise StopIteration
+        future = self._pending.popleft()
+        self._fill_pending()
+        return future.result()
+
+    def _fill_pending(self):
+        """ submit downloads until prefetch bodies are pending """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers)
+        while len(self._pending) < self._prefetch:
+            item = next(self._items, None)
+            if item is None:
+                break
+            self._pending.append(
+                self._executor.submit(
+                    self._fetch, item['Key'], item.get('ETag')
+                )
+            )
+            self._ctx += 1
+
+    def _fetch(self, key, etag=None):
+        cache = ObjectCache.default
+        if cache is not None:
+            chunks = cache.chunks(self._meta['bucket'], key, etag)
+        else:
+            chunks = ClientPool.client('s3').get_object(
+                Bucket=self._meta['bucket'], Key=key
+            )['Body'].iter_chunks()
+        _, data = decompress_stream(chunks, key)
+        return b''.join(data).decode('utf-8').strip()
+
+    def close(self):
+        """ cancel outstanding downloads and stop listing and prefetching """
+        if self._items is not None:
+            self._items.close()
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
 
     def aggregate(self):
         ys = []
@@ -1,8 +1,81 @@
-from typing import List, Tuple, Union
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tempfile import NamedTemporaryFile
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
-import boto3
+from botocore.exceptions import ClientError
 
-from pytargetingutilities.aws.s3.base_paginator import S3BasePaginator
+from pytargetingutilities.aws.client_pool import ClientPool
+from pytargetingutilities.aws.s3.aio import iterate
+from pytargetingutilities.aws.s3.base_paginator import S3BasePaginator, read_ahead
+from pytargetingutilities.aws.s3.object_cache import ObjectCache
+from pytargetingutilities.tools.codec import decompress_stream, detect
+
+CHUNK_SIZE = 64 * 1024
+ASYNC_BATCH_SIZE = 1000
+# codecs S3 Select can read
+SELECT_COMPRESSION = {None: 'NONE', 'gzip': 'GZIP', 'bz2': 'BZIP2'}
+# csv dialect that reads every line as a single column _1: unit separator as
+# delimiter, record separator as quote
+LINE_DIALECT = {'FieldDelimiter': '\x1f', 'QuoteCharacter': '\x1e'}
+# error codes of endpoints that do not implement S3 Select
+SELECT_UNSUPPORTED = {
+    'NotImplemented',
+    'XNotImplemented',
+    'MethodNotAllowed',
+    '501',
+    '405',
+}
+SELECT_STATS = [
+    'bytes_scanned',
+    'bytes_processed',
+    'bytes_returned',
+    'pushed_down',
+    'filtered_locally',
+]
+
+
+def iter_lines(
+    chunks: Iterable[bytes], offset: int = 0
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    split chunks into lines like StreamingBody.iter_lines and yield (byte offset,
+    line) tuples
+    """
+    pending = b''
+    for chunk in chunks:
+        lines = (pending + chunk).splitlines(True)
+        for line in lines[:-1]:
+            yield offset, line.splitlines()[0]
+            offset += len(line)
+        pending = lines[-1] if lines else b''
+    if pending:
+        yield offset, pending.splitlines()[0]
+
+
+def _json_matches(line: str, field: str, value) -> bool:
+    """
+    whether field of the JSON line equals value; like S3 Select, lines that are no
+    JSON objects never match
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return False
+    return isinstance(record, dict) and record.get(field) == value
 
 
 class S3LineIterator(S3BasePaginator):
@@ -14,23 +87,291 @@ class S3LineIterator(S3BasePaginator):
     This is a 'nested' iterator, since we iterate over objects and inside the objects we iterate over lines. We identify
     the objects by its key. Thus, we call the start and stop of a slice of the iterator iter_start(stop) and the start
     and stop of a slice inside a object key_start(stop).
+    Counting the lines of all objects requires reading them once. With a manifest (a
+    local path or an s3://bucket/key url) the line counts are stored together with the
+    ETags of the objects; later iterators only count objects whose ETag changed and
+    refresh the manifest afterwards.
+    With index_every = N the byte offset of every N-th line is recorded while counting
+    (and kept in the manifest). Slices then use ranged GETs that start at the closest
+    checkpoint before key_start and end at the closest checkpoint after key_stop, so
+    they only download about the bytes of the slice.
+    The objects are counted on first use of len(), a slice or iteration, on a thread
+    pool of the given number of workers. progress_hook(key, lines, seconds) is called
+    for every counted object; counting_seconds holds the wall time of the whole
+    counting pass. select does not need the line counts and never counts the objects.
+    Iterating streams the lines object by object, iter_batches groups them for
+    training loops; both only hold the current chunk (plus an optional bounded read
+    ahead buffer) in memory.
+    Objects compressed with gzip, bz2 or zstd (detected by extension or magic bytes)
+    are decompressed while streaming; the byte offset index is not recorded for them,
+    since ranges of compressed objects can not be decoded.
+    async for streams the lines on a background thread in batches of ASYNC_BATCH_SIZE
+    lines.
     """
 
-    def __init__(self, pages, meta):
+    def __init__(
+        self,
+        pages,
+        meta,
+        manifest: Optional[str] = None,
+        index_every: Optional[int] = None,
+        workers: int = 1,
+        progress_hook: Optional[Callable[[str, int, float], None]] = None,
+    ):
         super().__init__(pages, meta)
+        self._workers = workers
+        self._progress_hook = progress_hook
+        self.counting_seconds = 0.0
         self._key_len_map = None
-        self.total_lines = None
+        self._etags = {}
+        # key -> byte offsets of the lines 0, index_every, 2 * index_every, ...
+        self._offsets = {}
+        self._index_every = index_every
+        self._manifest = manifest
+        self._total_lines = None
+        self.select_stats = dict.fromkeys(SELECT_STATS, 0)
         self._load_keys()
-        self._set_key_len_map()
+
+    @property
+    def total_lines(self) -> int:
+        """ number of lines of all objects """
+        self._get_key_len_map()
+        return self._total_lines
 
     def __len__(self) -> int:
         return self.total_lines
 
+    def __iter__(self) -> Iterator[str]:
+        """ stream all lines of all objects """
+        for key, key_len, _ in self._get_key_len_map():
+            if key_len == 0:
+                continue
+            for _, line in iter_lines(self._object_data(key)):
+                yield line.decode('utf-8').strip()
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return iterate(iter(self), ASYNC_BATCH_SIZE)
+
+    def iter_batches(self, batch_size: int, prefetch: int = 0) -> Iterator[List[str]]:
+        """
+        stream all lines in lists of batch_size lines; the last batch may be smaller
+        Args:
+            batch_size: number of lines per batch
+            prefetch: number of lines that are read ahead by a background thread
+                while the current batch is consumed; 0 reads on demand
+
+        Returns:
+            iterator over lists of lines
+        """
+        if batch_size < 1:
+            raise ValueError('batch_size must be greater than 0')
+        lines = iter(self) if prefetch <= 0 else read_ahead(iter(self), prefetch)
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def select(
+        self,
+        contains: Optional[str] = None,
+        field: Optional[str] = None,
+        value: Union[str, int, float, bool, None] = None,
+        input_format: str = 'json',
+        pushdown: bool = True,
+    ) -> Iterator[str]:
+        """
+        stream the lines that contain the substring contains or whose field equals
+        value
+        The objects are filtered server-side with S3 Select, so only the matching
+        lines are transferred. Objects that S3 Select can not read (zstd compressed
+        objects, objects rejected by S3 Select before any record, endpoints without
+        S3 Select) are streamed and filtered client-side instead. Other errors, e.g.
+        connection errors, and errors raised after S3 Select returned its first event
+        are raised to the caller. Lines matched by field are serialized by S3 Select,
+        so their whitespace may differ from the stored lines. select_stats reports
+        bytes_scanned, bytes_processed and bytes_returned of the call and the number
+        of objects that were pushed_down or filtered_locally.
+        Args:
+            contains: substring of the matching lines
+            field: JSON field or CSV column that is compared with value
+            value: value of field in the matching lines
+            input_format: 'json' for JSON lines, 'csv' for CSV with a header line
+            pushdown: use S3 Select; False always filters client-side
+
+        Returns:
+            iterator over the matching lines
+        """
+        if (contains is None) == (field is None):
+            raise ValueError('select needs either contains or field')
+        if input_format not in ('json', 'csv'):
+            raise ValueError(f'Unknown input_format {input_format}')
+        self.select_stats = dict.fromkeys(SELECT_STATS, 0)
+        request = self._select_request(contains, field, value, input_format)
+        for key in self._keys:
+            lines = None
+            compression = SELECT_COMPRESSION.get(detect(key), None)
+            if pushdown and compression is not None:
+                lines, pushdown = self._select_object(key, compression, request)
+            if lines is None:
+                self.select_stats['filtered_locally'] += 1
+                lines = self._filter_object(key, contains, field, value, input_format)
+            else:
+                self.select_stats['pushed_down'] += 1
+            yield from lines
+
+    @staticmethod
+    def _select_request(
+        contains: Optional[str], field: Optional[str], value, input_format: str
+    ) -> Dict:
+        """ S3 Select expression and serialization of a select call """
+        if contains is not None:
+            pattern = (
+                contains.replace('\\', '\\\\')
+                .replace('%', '\\%')
+                .replace('_', '\\_')
+                .replace("'", "''")
+            )
+            header_info = 'IGNORE' if input_format == 'csv' else 'NONE'
+            return {
+                'ExpressionType': 'SQL',
+                'Expression': (
+                    f"SELECT s._1 FROM S3Object s WHERE s._1 LIKE '%{pattern}%' "
+                    "ESCAPE '\\'"
+                ),
+                'InputSerialization': {
+                    'CSV': dict(LINE_DIALECT, FileHeaderInfo=header_info)
+                },
+                'OutputSerialization': {
+                    'CSV': dict(LINE_DIALECT, QuoteFields='ASNEEDED')
+                },
+            }
+        if isinstance(value, bool):
+            literal = str(value).lower()
+        elif isinstance(value, (int, float)):
+            literal = repr(value)
+        else:
+            literal = "'" + str(value).replace("'", "''") + "'"
+        column = field.replace('"', '""')
+        if input_format == 'json':
+            serialization = {
+                'InputSerialization': {'JSON': {'Type': 'LINES'}},
+                'OutputSerialization': {'JSON': {'RecordDelimiter': '\n'}},
+            }
+        else:
+            serialization = {
+                'InputSerialization': {'CSV': {'FileHeaderInfo': 'USE'}},
+                'OutputSerialization': {'CSV': {}},
+            }
+        return dict(
+            serialization,
+            ExpressionType='SQL',
+            Expression=f'SELECT * FROM S3Object s WHERE s."{column}" = {literal}',
+        )
+
+    def _select_object(
+        self, key: str, compression: str, request: Dict
+    ) -> Tuple[Optional[Iterator[str]], bool]:
+        """
+        start S3 Select on an object; returns the iterator over the selected lines or
+        None if S3 Select failed before returning anything, and whether S3 Select
+        should be tried for further objects
+        """
+        params = dict(request, Bucket=self._meta['bucket'], Key=key)
+        params['InputSerialization'] = dict(
+            params['InputSerialization'], CompressionType=compression
+        )
+        try:
+            response = ClientPool.client('s3').select_object_content(**params)
+            events = iter(response['Payload'])
+            first = next(events, None)
+        except ClientError as e:
+            if e.response['Error']['Code'] in SELECT_UNSUPPORTED:
+                return None, False
+            # e.g. invalid records or a compressed object without extension, only
+            # this object is filtered locally
+            return None, True
+        except (KeyError, NotImplementedError):  # stand-ins without S3 Select e.g. moto
+            return None, False
+        return self._select_lines([first] if first else [], events), True
+
+    def _select_lines(self, *events: Iterable[Dict]) -> Iterator[str]:
+        """
+        split the record events of S3 Select into lines and add its stats to
+        select_stats
+        """
+        stats = {
+            'bytes_scanned': 'BytesScanned',
+            'bytes_processed': 'BytesProcessed',
+            'bytes_returned': 'BytesReturned',
+        }
+
+        def records():
+            for event_stream in events:
+                for event in event_stream:
+                    if 'Records' in event:
+                        yield event['Records']['Payload']
+                    elif 'Stats' in event:
+                        details = event['Stats']['Details']
+                        for name, detail in stats.items():
+                            self.select_stats[name] += details.get(detail, 0)
+
+        for _, line in iter_lines(records()):
+            line = line.decode('utf-8').strip()
+            if line:
+                yield line
+
+    def _filter_object(
+        self,
+        key: str,
+        contains: Optional[str],
+        field: Optional[str],
+        value,
+        input_format: str,
+    ) -> Iterator[str]:
+        """ stream an object and filter its lines client-side like S3 Select """
+
+        def scanned(chunks):
+            for chunk in chunks:
+                self.select_stats['bytes_scanned'] += len(chunk)
+                yield chunk
+
+        chunks = scanned(self._object_chunks(key))
+        lines = iter_lines(decompress_stream(chunks, key)[1])
+        matches = None
+        if input_format == 'csv':
+            header = next(lines, None)
+            if header is None:
+                return
+            self.select_stats['bytes_processed'] += len(header[1]) + 1
+            if field is not None:
+                columns = next(csv.reader([header[1].decode('utf-8').strip()]))
+                if field not in columns:
+                    return
+                column = columns.index(field)
+                matches = lambda line: (  # noqa: E731
+                    next(csv.reader([line]))[column] == str(value)
+                )
+        elif field is not None:
+            matches = lambda line: _json_matches(line, field, value)  # noqa: E731
+        if matches is None:
+            matches = lambda line: contains in line  # noqa: E731
+        for _, line in lines:
+            self.select_stats['bytes_processed'] += len(line) + 1
+            line = line.decode('utf-8').strip()
+            if line and matches(line):
+                self.select_stats['bytes_returned'] += len(line.encode('utf-8')) + 1
+                yield line
+
     def __getitem__(self, item: slice) -> List[str]:
         """ slice of lines from s3 objects; is only defined for slices without step [a:b:None], not subscript [a] """
         if not isinstance(item, slice):
             raise NotImplementedError('Only slicing is allowed, not subscripting; '
-                                      'if you want to iterate over all lines, use [:]')
+                                      'if you want to iterate over all lines, '
+                                      'iterate over the iterator')
         if item.step is not None:
             raise NotImplementedError('Slicing with step is not implemented')
         if item.start is not None and item.start > self.__len__():
@@ -45,34 +386,157 @@ class S3LineIterator(S3BasePaginator):
 
     def _load_keys(self) -> None:
         """ load the keys of all objects in pages """
-        for page in self._pages:
-            if 'Contents' in page:
-                for item in page['Contents']:
-                    self._keys.append(item['Key'])
-            else:
-                self._keys.append(page['Key'])
+        for item in self._iter_items():
+            self._keys.append(item['Key'])
+            self._etags[item['Key']] = item.get('ETag')
         self._keys.sort()
 
+    def _get_key_len_map(self) -> List[Tuple[str, int, int]]:
+        """ the key_len_map; the objects are counted on first use """
+        if self._key_len_map is None:
+            self._set_key_len_map()
+        return self._key_len_map
+
     def _set_key_len_map(self) -> None:
         """ determine len of objects and the index of their first line in the context of the whole iterator """
+        known = self._read_manifest()
+        counted = self._count_lines(
+            [
+                key
+                for key in self._keys
+                if not self._is_valid_entry(key, known.get(key))
+            ]
+        )
         key_len_map = []  # list of tuples (key of object, number of lines in object, index of line 0 in iterator)
         iter_index = 0
         for key in self._keys:
-            key_len = self._object_len(key)
+            if key in counted:
+                key_len = counted[key]
+            else:
+                key_len = known[key]['lines']
+                if self._index_every is not None:
+                    self._offsets[key] = known[key]['offsets']
             key_len_map.append((key, key_len, iter_index))
             iter_index += key_len
         self._key_len_map = key_len_map
-        self.total_lines = iter_index
+        self._total_lines = iter_index
+        if self._manifest is not None and known != self._manifest_entries():
+            self._write_manifest()
+
+    def _count_lines(self, keys: List[str]) -> Dict[str, int]:
+        """ count the lines of the objects concurrently """
+        start = time.perf_counter()
+        counted = {}
+        with ThreadPoolExecutor(max_workers=max(self._workers, 1)) as executor:
+            futures = [executor.submit(self._timed_object_len, key) for key in keys]
+            for future in as_completed(futures):
+                key, key_len, seconds = future.result()
+                counted[key] = key_len
+                if self._progress_hook is not None:
+                    self._progress_hook(key, key_len, seconds)
+        self.counting_seconds = time.perf_counter() - start
+        return counted
+
+    def _timed_object_len(self, key: str) -> Tuple[str, int, float]:
+        start = time.perf_counter()
+        key_len = self._object_len(key)
+        return key, key_len, time.perf_counter() - start
+
+    def _is_valid_entry(self, key: str, entry: Optional[dict]) -> bool:
+        if entry is None or entry['etag'] != self._etags[key]:
+            return False
+        return self._index_every is None or (
+            entry.get('index_every') == self._index_every and 'offsets' in entry
+        )
+
+    def _manifest_entries(self) -> Dict[str, dict]:
+        entries = {}
+        for key, key_len, line0_index in self._key_len_map:
+            entries[key] = {
+                'key': key,
+                'etag': self._etags[key],
+                'lines': key_len,
+                'line0': line0_index,
+            }
+            if key in self._offsets:
+                entries[key]['index_every'] = self._index_every
+                entries[key]['offsets'] = self._offsets[key]
+        return entries
+
+    def _read_manifest(self) -> Dict[str, dict]:
+        """ entries of the manifest by key; empty if there is no (readable) manifest """
+        if self._manifest is None:
+            return {}
+        try:
+            if self._manifest.startswith('s3://'):
+                bucket, key = self._manifest[len('s3://'):].split('/', 1)
+                response = ClientPool.client('s3').get_object(Bucket=bucket, Key=key)
+                data = response['Body'].read()
+            else:
+                with open(self._manifest, 'rb') as f:
+                    data = f.read()
+            return {entry['key']: entry for entry in json.loads(data)['objects']}
+        except ClientError as ex:
+            if ex.response['Error']['Code'] == 'NoSuchKey':
+                return {}
+            raise
+        except (FileNotFoundError, ValueError, KeyError):
+            return {}
+
+    def _write_manifest(self) -> None:
+        data = json.dumps({
+            'bucket': self._meta['bucket'],
+            'objects': list(self._manifest_entries().values()),
+        }).encode('utf-8')
+        if self._manifest.startswith('s3://'):
+            bucket, key = self._manifest[len('s3://'):].split('/', 1)
+            ClientPool.client('s3').put_object(Bucket=bucket, Key=key, Body=data)
+            return
+        # write to a temporary file and rename it, so that readers never see a
+        # partial manifest
+        directory = os.path.dirname(os.path.abspath(self._manifest))
+        with NamedTemporaryFile(dir=directory, delete=False) as f:
+            f.write(data)
+        os.replace(f.name, self._manifest)
 
     def _object_len(self, key: str) -> int:
+        """
+        count the lines of an object; records the byte offset index of the object if
+        enabled
+        """
+        offsets = []
+        codec, data = decompress_stream(self._object_chunks(key), key)
+        index_offsets = self._index_every is not None and codec is None
         i = -1  # in case there are no lines to iterate over
-        for i, _ in enumerate(boto3.resource('s3')
-                                   .Object(self._meta['bucket'], key)
-                                   .get()['Body']
-                                   .iter_lines()):
-            pass
+        for i, (offset, _) in enumerate(iter_lines(data)):
+            if index_offsets and i % self._index_every == 0:
+                offsets.append(offset)
+        if self._index_every is not None:
+            self._offsets[key] = offsets
         return i + 1
 
+    def _object_chunks(
+        self, key: str, byte_start: int = 0, byte_stop: Optional[int] = None
+    ) -> Iterator[bytes]:
+        """
+        stream the bytes [byte_start, byte_stop) of an object, from
+        ObjectCache.default if it is set
+        """
+        if ObjectCache.default is not None:
+            return ObjectCache.default.chunks(
+                self._meta['bucket'], key, self._etags.get(key), byte_start, byte_stop
+            )
+        params = {'Bucket': self._meta['bucket'], 'Key': key}
+        if byte_start > 0 or byte_stop is not None:
+            byte_end = '' if byte_stop is None else byte_stop - 1
+            params['Range'] = f'bytes={byte_start}-{byte_end}'
+        body = ClientPool.client('s3').get_object(**params)['Body']
+        return body.iter_chunks(CHUNK_SIZE)
+
+    def _object_data(self, key: str) -> Iterator[bytes]:
+        """ stream the whole, decompressed object """
+        return decompress_stream(self._object_chunks(key), key)[1]
+
     def _get_key_slices(self, iter_start: Union[int, None], iter_stop: Union[int, None]) -> List[Tuple[str, int, int]]:
         """
         for each key get the start and stop of the slice of the object that belong to the iterator slice defined by
@@ -90,7 +554,7 @@ class S3LineIterator(S3BasePaginator):
         if iter_stop is None:
             iter_stop = len(self)
         key_slices = []
-        for key, object_len, line0_index in self._key_len_map:
+        for key, object_len, line0_index in self._get_key_len_map():
             if iter_stop < line0_index or (iter_start >= (line0_index + object_len)):  # object not in iter slice
                 continue
             key_start = iter_start - line0_index  # may be negative, which does not hurt
@@ -101,10 +565,21 @@ class S3LineIterator(S3BasePaginator):
     def _object_get_lines(self, key: str, key_start: int, key_stop: int) -> List[str]:
         """ iterate over the object belonging to key and get the lines from start to stop """
         lines = []
-        for index, line in enumerate(boto3.resource('s3')
-                                          .Object(self._meta['bucket'], key)
-                                          .get()['Body']
-                                          .iter_lines()):
+        if key_stop <= max(key_start, 0):
+            return lines
+        index, byte_start, byte_stop = 0, 0, None
+        offsets = self._offsets.get(key)
+        if offsets:
+            checkpoint = min(max(key_start, 0) // self._index_every, len(offsets) - 1)
+            index, byte_start = checkpoint * self._index_every, offsets[checkpoint]
+            stop_checkpoint = -(-key_stop // self._index_every)  # ceil
+            if stop_checkpoint < len(offsets):
+                byte_stop = offsets[stop_checkpoint]
+        if offsets:
+            chunks = self._object_chunks(key, byte_start, byte_stop)
+        else:
+            chunks = self._object_data(key)
+        for index, (_, line) in enumerate(iter_lines(chunks), index):
             if index < key_start:
                 continue
             if index >= key_stop:
@@ -114,4 +589,4 @@ class S3LineIterator(S3BasePaginator):
 
     def aggregate(self) -> List[str]:
         """ Return all lines of all objects """
-        return [line for line in self[:]]
+        return list(self)
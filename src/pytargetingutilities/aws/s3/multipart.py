@@ -0,0 +1,155 @@
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from pytargetingutilities.aws.client_pool import ClientPool
+
+MB = 1024 * 1024
+
+
+class MultipartWriter:
+    """
+    Binary file-like object that uploads everything written to it to s3.
+    Full parts are uploaded on a thread pool while the producer keeps writing;
+    at most 2 * workers parts are held in memory. Small outputs that never
+    fill a part are uploaded with a single put_object on close. The md5
+    digest of the written bytes is computed on the same pass.
+    Use it as context manager: the upload is completed when the block exits
+    and aborted if it raises.
+    """
+
+    def __init__(self, bucket, key, part_size=8 * MB, workers=4, extra_args=None):
+        """
+        Args:
+            bucket (str): target bucket
+            key (str): target key
+            part_size (int): size of the uploaded parts, s3 requires at least
+                5 MB for all parts but the last
+            workers (int): number of parts uploaded concurrently
+            extra_args (dict, optional): extra put_object /
+                create_multipart_upload arguments e.g. Metadata
+        """
+        self.bucket = bucket
+        self.key = key
+        self._part_size = part_size
+        self._workers = workers
+        self._extra_args = extra_args or {}
+        self._buffer = bytearray()
+        self._hash = hashlib.md5()
+        self._upload_id = None
+        self._executor = None
+        self._pending = deque()
+        self._parts = []
+        self.closed = False
+        self.bytes_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def writable(self):
+        return True
+
+    def readable(self):
+        return False
+
+    def seekable(self):
+        return False
+
+    def flush(self):
+        """Parts are uploaded as soon as they are full"""
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('write to closed MultipartWriter')
+        self._buffer += data
+        self._hash.update(data)
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self._part_size:
+            part = bytes(self._buffer[:self._part_size])
+            del self._buffer[:self._part_size]
+            self._submit(part)
+        return len(data)
+
+    def hexdigest(self):
+        """md5 digest of all bytes written so far"""
+        return self._hash.hexdigest()
+
+    def close(self):
+        """Uploads the remaining bytes and completes the upload"""
+        if self.closed:
+            return
+        s3 = ClientPool.client('s3')
+        try:
+            if self._upload_id is None:
+                s3.put_object(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    Body=bytes(self._buffer),
+                    **self._extra_args,
+                )
+            else:
+                if self._buffer:
+                    self._submit(bytes(self._buffer))
+                while self._pending:
+                    self._parts.append(self._pending.popleft().result())
+                s3.complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={'Parts': self._parts},
+                )
+        except Exception:
+            self.abort()
+            raise
+        self._buffer = bytearray()
+        self._shutdown()
+        self.closed = True
+
+    def abort(self):
+        """Stops the upload, uploaded parts are deleted"""
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._shutdown()
+        if self._upload_id is not None:
+            ClientPool.client('s3').abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+            self._upload_id = None
+        self._buffer = bytearray()
+        self.closed = True
+
+    def _submit(self, part):
+        if self._upload_id is None:
+            self._upload_id = ClientPool.client('s3').create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, **self._extra_args
+            )['UploadId']
+            self._executor = ThreadPoolExecutor(max_workers=self._workers)
+        # wait for the oldest part to bound the memory of pending parts
+        while len(self._pending) >= 2 * self._workers:
+            self._parts.append(self._pending.popleft().result())
+        part_number = len(self._parts) + len(self._pending) + 1
+        self._pending.append(
+            self._executor.submit(self._upload_part, part_number, part)
+        )
+
+    def _upload_part(self, part_number, part):
+        response = ClientPool.client('s3').upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=part,
+        )
+        return {'ETag': response['ETag'], 'PartNumber': part_number}
+
+    def _shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,266 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from tempfile import mkstemp
+
+from botocore.exceptions import ClientError
+
+from pytargetingutilities.aws.client_pool import ClientPool
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ObjectCache:
+    """
+    Local disk cache of s3 objects addressed by bucket, key and ETag.
+    Set ObjectCache.default to use it transparently in S3Helper.read,
+    S3Iterator and S3LineIterator.
+    Callers that know the ETag of an object (e.g. from a listing) read the
+    cached copy without any request. Otherwise the current ETag is looked up
+    with a HEAD request, or at most once per ttl seconds if ttl is set.
+    Copies are written to a temporary file and renamed, so processes sharing
+    the directory never read partial copies. Once the cached copies exceed
+    max_bytes the least recently used ones are deleted. The sizes and last
+    uses of the copies are read from the directory once and tracked in
+    memory afterwards; copies filled by other processes are tracked as soon
+    as this instance reads them.
+    An ETag passed by the caller pins the version: if the object changed
+    since, the PreconditionFailed ClientError of the GET is raised instead
+    of reading another version.
+    hits, misses, bytes_hit, bytes_missed and head_requests count the
+    reads of this instance.
+    """
+
+    # cache used by S3Helper.read, S3Iterator and S3LineIterator if set
+    default = None
+
+    def __init__(self, directory, max_bytes=10 * 1024 ** 3, ttl=None):
+        """
+        Args:
+            directory (str): directory of the cached copies, can be shared by
+                processes
+            max_bytes (int): maximal size of all cached copies
+            ttl (float, optional): seconds an ETag looked up by HEAD is
+                trusted; None validates every read without ETag by HEAD
+        """
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.bytes_hit = 0
+        self.bytes_missed = 0
+        self.head_requests = 0
+        self._lock = threading.Lock()
+        self._copies = None  # path -> size, least recently used first
+        self._bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, bucket, key, etag=None):
+        """Returns the path of the cached copy of an object and downloads
+        it first on a miss
+
+        Args:
+            bucket (str): name of the s3 bucket
+            key (str): key of the object
+            etag (str, optional): ETag of the object, looked up if None
+
+        Returns:
+            str: path of the cached copy
+        """
+        pinned = etag is not None
+        if etag is None:
+            etag = self._current_etag(bucket, key)
+        etag = etag.strip('"')
+        path = self._data_path(bucket, key, etag)
+        try:
+            size = os.stat(path).st_size
+            os.utime(path)  # most recently used
+        except FileNotFoundError:
+            try:
+                size = self._fill(bucket, key, etag, path)
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                if pinned or code not in ('412', 'PreconditionFailed'):
+                    raise
+                # the object changed since its ETag was looked up
+                self._remove(self._base_path(bucket, key) + '.ref')
+                return self.path(bucket, key)
+            self._count(hit=False, size=size)
+            return path
+        self._used(path, size)
+        self._count(hit=True, size=size)
+        return path
+
+    def chunks(self, bucket, key, etag=None, byte_start=0, byte_stop=None):
+        """Streams the bytes [byte_start, byte_stop) of the cached copy"""
+        for _ in range(2):
+            try:
+                f = open(self.path(bucket, key, etag), 'rb')
+                break
+            except FileNotFoundError:  # evicted by another process
+                continue
+        else:
+            raise FileNotFoundError(f'{bucket}/{key} was evicted while read')
+        return self._read_chunks(f, byte_start, byte_stop)
+
+    def read(self, bucket, key, etag=None):
+        """Returns the body of an object"""
+        return b''.join(self.chunks(bucket, key, etag))
+
+    def clear(self):
+        """Deletes all cached copies and resets the counters"""
+        for path in self._entries():
+            self._remove(path)
+        with self._lock:
+            self._copies = OrderedDict()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.bytes_hit = 0
+            self.bytes_missed = 0
+            self.head_requests = 0
+
+    @staticmethod
+    def _read_chunks(f, byte_start, byte_stop):
+        with f:
+            f.seek(byte_start)
+            remaining = None if byte_stop is None else byte_stop - byte_start
+            while remaining is None or remaining > 0:
+                size = CHUNK_SIZE if remaining is None else min(
+                    CHUNK_SIZE, remaining
+                )
+                chunk = f.read(size)
+                if not chunk:
+                    return
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def _count(self, hit, size):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.bytes_hit += size
+            else:
+                self.misses += 1
+                self.bytes_missed += size
+
+    def _base_path(self, bucket, key):
+        name = hashlib.sha256(f'{bucket}/{key}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name[:2], name)
+
+    def _data_path(self, bucket, key, etag):
+        etag = re.sub(r'[^0-9a-zA-Z-]', '', etag)
+        return f'{self._base_path(bucket, key)}-{etag}.obj'
+
+    def _current_etag(self, bucket, key):
+        """ETag of the object, from the last HEAD request if within ttl"""
+        ref_path = self._base_path(bucket, key) + '.ref'
+        if self.ttl is not None:
+            try:
+                if time.time() - os.stat(ref_path).st_mtime < self.ttl:
+                    with open(ref_path) as f:
+                        return f.read()
+            except FileNotFoundError:
+                pass
+        etag = ClientPool.client('s3').head_object(Bucket=bucket, Key=key)[
+            'ETag'
+        ].strip('"')
+        with self._lock:
+            self.head_requests += 1
+        if self.ttl is not None:
+            self._write_atomic(ref_path, [etag.encode('utf-8')])
+        return etag
+
+    def _fill(self, bucket, key, etag, path):
+        """Downloads the object version with etag to path, returns its size"""
+        body = ClientPool.client('s3').get_object(
+            Bucket=bucket, Key=key, IfMatch=f'"{etag}"'
+        )['Body']
+        size = self._write_atomic(path, body.iter_chunks(CHUNK_SIZE))
+        # older versions of the object are never read again
+        prefix = os.path.basename(self._base_path(bucket, key)) + '-'
+        for entry in os.scandir(os.path.dirname(path)):
+            if entry.name.startswith(prefix) and entry.path != path:
+                self._remove(entry.path)
+                self._forget(entry.path)
+        self._used(path, size)
+        self._evict(keep=path)
+        return size
+
+    @staticmethod
+    def _write_atomic(path, chunks):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = mkstemp(dir=directory, prefix='.', suffix='.tmp')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return size
+
+    def _entries(self):
+        for directory in os.scandir(self.directory):
+            if directory.is_dir():
+                yield from (
+                    entry.path
+                    for entry in os.scandir(directory.path)
+                    if not entry.name.startswith('.')
+                )
+
+    def _load_copies(self):
+        """Reads the sizes and last uses of the copies on first use"""
+        if self._copies is not None:
+            return
+        copies = []
+        for path in self._entries():
+            if path.endswith('.obj'):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                copies.append((stat.st_mtime, path, stat.st_size))
+        self._copies = OrderedDict(
+            (path, size) for _, path, size in sorted(copies)
+        )
+        self._bytes = sum(self._copies.values())
+
+    def _used(self, path, size):
+        """Marks a copy as most recently used"""
+        with self._lock:
+            self._load_copies()
+            self._bytes += size - self._copies.pop(path, 0)
+            self._copies[path] = size
+
+    def _forget(self, path):
+        with self._lock:
+            self._load_copies()
+            self._bytes -= self._copies.pop(path, 0)
+
+    def _evict(self, keep):
+        """Deletes the least recently used copies above max_bytes"""
+        with self._lock:
+            self._load_copies()
+            for path in list(self._copies):
+                if self._bytes <= self.max_bytes:
+                    break
+                if path != keep:
+                    self._remove(path)
+                    self._bytes -= self._copies.pop(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
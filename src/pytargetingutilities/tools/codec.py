@@ -0,0 +1,97 @@
+import bz2
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, pip install pytargetingutilities[zstd]
+    zstandard = None
+
+EXTENSIONS = {
+    '.gz': 'gzip',
+    '.gzip': 'gzip',
+    '.bz2': 'bz2',
+    '.zst': 'zstd',
+    '.zstd': 'zstd',
+}
+
+
+def detect(name='', head=b''):
+    """Returns the compression codec of a file
+
+    Args:
+        name (str): file name or s3 key, checked for a known extension
+        head (bytes): first bytes of the file, checked for magic bytes
+
+    Returns:
+        str: gzip, bz2, zstd or None if the file is not compressed
+    """
+    for extension, codec in EXTENSIONS.items():
+        if name.lower().endswith(extension):
+            return codec
+    if head[:2] == b'\x1f\x8b':
+        return 'gzip'
+    # stream header followed by the magic of a block or of the stream end
+    if head[:3] == b'BZh' and head[4:10] in (b'1AY&SY', b'\x17rE8P\x90'):
+        return 'bz2'
+    if head[:4] == b'\x28\xb5\x2f\xfd':
+        return 'zstd'
+    return None
+
+
+def decompress_stream(chunks, name=''):
+    """Detects the codec of a byte stream and decompresses it on the fly
+
+    Args:
+        chunks (Iterable[bytes]): raw chunks of the file
+        name (str): file name or s3 key used for detection by extension
+
+    Returns:
+        (str, Iterator[bytes]): codec (None if not compressed) and the
+        decompressed chunks
+    """
+    chunks = iter(chunks)
+    head = b''
+    for head in chunks:
+        if head:
+            break
+    codec = detect(name, head)
+    stream = _chain(head, chunks)
+    if codec is None:
+        return None, stream
+    return codec, _decompress(stream, _decompressor_factory(codec))
+
+
+def _chain(head, chunks):
+    if head:
+        yield head
+    yield from chunks
+
+
+def _decompressor_factory(codec):
+    if codec == 'gzip':
+        # 32 + MAX_WBITS accepts gzip and zlib headers
+        return lambda: zlib.decompressobj(32 + zlib.MAX_WBITS)
+    if codec == 'bz2':
+        return bz2.BZ2Decompressor
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ImportError(
+                'zstandard is required for .zst files, '
+                'install pytargetingutilities[zstd]'
+            )
+        return lambda: zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f'Unknown codec {codec}')
+
+
+def _decompress(chunks, factory):
+    """ decompress chunks, concatenated members/frames are supported """
+    decompressor = factory()
+    for chunk in chunks:
+        while chunk:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            if not decompressor.eof:
+                break
+            chunk = decompressor.unused_data
+            decompressor = factory()
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+import time
+
+from pytargetingutilities.tools.hash import file_digest
+
+
+class DigestCache:
+    """
+    Persistent cache of file digests stored in a SQLite database.
+    A digest is reused as long as path, inode, size and mtime_ns of the file
+    are unchanged, so unchanged files are never read again. The cache keeps
+    at most max_entries digests and evicts the least recently used ones.
+    The database can be shared by threads and processes.
+    """
+
+    def __init__(self, path=':memory:', max_entries=10000):
+        """
+        Args:
+            path (str): path of the SQLite database, :memory: keeps the
+                cache in memory of the current process
+            max_entries (int): maximal number of cached digests
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.expanduser(path), timeout=30, check_same_thread=False
+        )
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS digests ('
+                'path TEXT, algorithm TEXT, inode INTEGER, size INTEGER, '
+                'mtime_ns INTEGER, digest TEXT, last_used REAL, '
+                'PRIMARY KEY (path, algorithm))'
+            )
+
+    def digest(self, file_path, algorithm='md5', digest_func=None):
+        """Returns the cached digest of a file or computes and caches it
+
+        Args:
+            file_path (str): path of the file
+            algorithm (str): hashlib algorithm name; any other name can be
+                used together with digest_func
+            digest_func (Callable, optional): function that computes the
+                digest of a path, defaults to tools.hash.file_digest
+
+        Returns:
+            str: digest or None if the file does not exist
+        """
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        path = os.path.abspath(file_path)
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT inode, size, mtime_ns, digest FROM digests '
+                'WHERE path = ? AND algorithm = ?',
+                (path, algorithm),
+            ).fetchone()
+            if row is not None and tuple(row[:3]) == key:
+                self.hits += 1
+                with self._db:
+                    self._db.execute(
+                        'UPDATE digests SET last_used = ? '
+                        'WHERE path = ? AND algorithm = ?',
+                        (time.time(), path, algorithm),
+                    )
+                return row[3]
+            self.misses += 1
+        if digest_func is None:
+            digest = file_digest(file_path, algorithm)
+        else:
+            digest = digest_func(file_path)
+        if digest is not None:
+            self._store(path, algorithm, key, digest)
+        return digest
+
+    def clear(self):
+        """Removes all digests and resets the counters"""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM digests')
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM digests').fetchone()[0]
+
+    def _store(self, path, algorithm, key, digest):
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (path, algorithm, *key, digest, time.time()),
+            )
+            self._db.execute(
+                'DELETE FROM digests WHERE rowid IN ('
+                'SELECT rowid FROM digests ORDER BY last_used DESC '
+                'LIMIT -1 OFFSET ?)',
+                (self.max_entries,),
+            )
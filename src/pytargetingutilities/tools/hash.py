@@ -1,16 +1,198 @@
 import hashlib
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
+CHUNK_SIZE = 1024 * 1024
+# defaults of boto3.s3.transfer.TransferConfig and s3 multipart limits
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+MAX_PARTS = 10000
 
-def md5(file_path):
-    hash_md5 = hashlib.md5()
+
+def file_digest(file_path, algorithm='md5', chunk_size=CHUNK_SIZE):
+    """Returns the hex digest of a file or None if it does not exist.
+    The file is read with readinto into one reused buffer; hashlib releases
+    the GIL for large updates, so several files can be hashed in parallel.
+
+    Args:
+        file_path (str): path of the file
+        algorithm (str): hashlib algorithm name
+        chunk_size (int): size of the read buffer
+
+    Returns:
+        str: hex digest
+    """
+    file_hash = hashlib.new(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
     try:
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b''):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        with open(file_path, 'rb', buffering=0) as f:
+            for size in iter(lambda: f.readinto(buffer), 0):
+                file_hash.update(view[:size])
+        return file_hash.hexdigest()
     except FileNotFoundError:
         return None
 
+
+def md5(file_path, cache=None):
+    if cache is not None:
+        return cache.digest(file_path, 'md5')
+    return file_digest(file_path, 'md5')
+
+
+def hash_files(file_paths, algorithm='md5', workers=None, cache=None):
+    """Hashes many files concurrently
+
+    Args:
+        file_paths (Iterable[str]): paths of the files
+        algorithm (str): hashlib algorithm name
+        workers (int, optional): number of threads, defaults to the number
+            of cpus
+        cache (DigestCache, optional): cache of digests of unchanged files
+
+    Returns:
+        dict: hex digest (None for missing files) by path
+    """
+    file_paths = list(file_paths)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        digests = executor.map(
+            lambda path: file_digest(path, algorithm)
+            if cache is None
+            else cache.digest(path, algorithm),
+            file_paths,
+        )
+        return dict(zip(file_paths, digests))
+
+
+def s3_etag(
+    file_path,
+    multipart_threshold=MULTIPART_THRESHOLD,
+    multipart_chunksize=MULTIPART_CHUNKSIZE,
+    workers=None,
+):
+    """Returns the ETag s3 assigns to a file uploaded with boto3
+    upload_file and a TransferConfig with the given threshold and chunksize,
+    or None if the file does not exist. Files below the threshold get their
+    md5 digest, larger files the md5 of the part digests with a -<parts>
+    suffix. The file is read once; parts are hashed on a thread pool.
+
+    Args:
+        file_path (str): path of the file
+        multipart_threshold (int): TransferConfig.multipart_threshold
+        multipart_chunksize (int): TransferConfig.multipart_chunksize
+        workers (int, optional): number of threads hashing parts, defaults
+            to the number of cpus
+
+    Returns:
+        str: ETag without quotes
+    """
+    try:
+        size = os.path.getsize(file_path)
+    except FileNotFoundError:
+        return None
+    if size < multipart_threshold:
+        return file_digest(file_path, 'md5')
+    part_size = _part_size(size, multipart_chunksize)
+    workers = workers or os.cpu_count()
+    pending = deque()
+    part_digests = []
+    with open(file_path, 'rb', buffering=0) as f, ThreadPoolExecutor(
+        max_workers=workers
+    ) as executor:
+        for part in iter(lambda: _read_part(f, part_size), b''):
+            # bound the number of parts in memory
+            if len(pending) >= 2 * workers:
+                part_digests.append(pending.popleft().result())
+            pending.append(
+                executor.submit(lambda data: hashlib.md5(data).digest(), part)
+            )
+        part_digests.extend(future.result() for future in pending)
+    etag = hashlib.md5(b''.join(part_digests)).hexdigest()
+    return f'{etag}-{len(part_digests)}'
+
+
+def _read_part(f, size):
+    """
+    size bytes of an unbuffered file or the rest of it; a single read returns
+    at most about 2 GiB on linux, so it is repeated until the part is full
+    """
+    part = bytearray(size)
+    view = memoryview(part)
+    filled = 0
+    while filled < size:
+        count = f.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+    view.release()
+    del part[filled:]
+    return part
+
+
+def _part_size(size, chunksize):
+    """ part size used by s3transfer, see s3transfer.utils.ChunksizeAdjuster """
+    chunksize = min(max(chunksize, MIN_PART_SIZE), MAX_PART_SIZE)
+    while -(-size // chunksize) > MAX_PARTS:
+        chunksize *= 2
+    return chunksize
+
+
 def md5_str(text):
     hash_object = hashlib.md5(text.encode())
     return hash_object.hexdigest()
+
+
+class HashingWriter:
+    """
+    Binary file-like wrapper that hashes all bytes while they are written to
+    the wrapped file object, so the file does not have to be read again for
+    its digest. Without a file object the bytes are only hashed.
+    close() flushes the wrapped file and closes it only with close_file.
+    """
+
+    def __init__(self, fileobj=None, algorithm='md5', close_file=False):
+        self._file = fileobj
+        self._hash = hashlib.new(algorithm)
+        self._close_file = close_file
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('write to closed HashingWriter')
+        self._hash.update(data)
+        if self._file is not None:
+            self._file.write(data)
+        return len(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def writable(self):
+        return True
+
+    def readable(self):
+        return False
+
+    def seekable(self):
+        return False
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        if self._close_file and self._file is not None:
+            self._file.close()
+        self.closed = True
@@ -1,8 +1,13 @@
-
 import re
-from typing import List
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable, List, Tuple, Union
 from urllib.parse import urlparse
 
+TOKENS_CACHE_SIZE = 100_000
+
+_SPLITTER = re.compile(r'[!"#$%&()\*\+,-\./:;<=>?@\[\\\]^_`{|}~\'\d]')
+
 
 def tokens(url: str, min_length=3) -> List[str]:
     """ Tokenize a URL using regex.
@@ -13,58 +18,105 @@ def tokens(url: str, min_length=3) -> List[str]:
     url = url.lower()
     parsed = urlparse(url)
     token_list = [parsed.netloc] + [
-        token
-        for token in re.split(
-            r'[!"#$%&()\*\+,-\./:;<=>?@\[\\\]^_`{|}~\'\d]', parsed.path
-        )
-        if token != ""
+        token for token in _SPLITTER.split(parsed.path) if token != ""
     ]
     return list(filter(lambda x: len(x) >= min_length, token_list))
 
 
+@lru_cache(maxsize=TOKENS_CACHE_SIZE)
+def _cached_tokens(url: str, min_length: int) -> Tuple[str, ...]:
+    return tuple(tokens(url, min_length))
+
+
+def tokens_batch(
+    urls: Iterable[str], min_length=3, flat=False
+) -> Union[List[List[str]], Tuple[List[str], List[int]]]:
+    """ Tokenize many URLs, repeated URLs are served from an LRU cache.
+    :param urls: URLs to tokenize
+    :param min_length: minimum length of tokens
+    :param flat: return all tokens in one list plus offsets instead of one
+    list per URL; the tokens of the i-th URL are
+    flat_tokens[offsets[i]:offsets[i + 1]]
+    :return: list of token lists or tuple (flat_tokens, offsets)
+    """
+    if not flat:
+        return [list(_cached_tokens(url, min_length)) for url in urls]
+    flat_tokens = []
+    offsets = [0]
+    for url in urls:
+        flat_tokens.extend(_cached_tokens(url, min_length))
+        offsets.append(len(flat_tokens))
+    return flat_tokens, offsets
+
+
+def tokens_cache_info():
+    """ Hits, misses, maxsize and currsize of the tokens_batch cache """
+    return _cached_tokens.cache_info()
+
+
+def tokens_cache_clear():
+    """ Empty the tokens_batch cache and reset its statistics """
+    _cached_tokens.cache_clear()
+
+
+def equals(x: str, y: str) -> bool:
+    """ Default token comparison of relevant_tokens """
+    return x == y
+
+
 def relevant_tokens(
     urls: List[str],
-    compare_func=lambda x, y: x == y,
+    compare_func=equals,
     min_length=3,
     not_allowed=[],
     sort_key=lambda x: (x[1], len(x[0]), x[0]),
 ) -> List[str]:
     """
     Finds relevant tokens in a list of urls for matching purposes.
+    For every url (in the given order) that does not contain an already found
+    token, the highest ranked token matching one of its tokens is added.
     :param urls: List of urls
     :param compare_func: Function to compare two tokens (default: ==)
     :param min_length: Minimum length of a token (default: 3)
     :param not_allowed: List of tokens that
+    should not be considered (default: [])
     :param sort_key: Function to sort the tokens (default: sort by occurrence,
     then by token length, then by token)
-    should not be considered (default: [])
     :return: List of relevant tokens
     """
-    urls_tokens = list(map(lambda x: tokens(x, min_length), urls))
-    all_tokens = [token for url_tokens in urls_tokens for token in url_tokens]
-    sorted_tokens = sorted(
-        [(x, all_tokens.count(x)) for x in set(all_tokens)],
-        key=sort_key,
-        reverse=True,
+    urls_tokens = tokens_batch(urls, min_length)
+    counts = Counter(
+        token for url_tokens in urls_tokens for token in url_tokens
     )
-    relevant_tokens = list(map(lambda x: x[0], sorted_tokens))
+    not_allowed = set(not_allowed)
+    ranked_tokens = [
+        token
+        for token, _ in sorted(counts.items(), key=sort_key, reverse=True)
+        if token not in not_allowed
+    ]
+    if compare_func is equals:
+        rank = {token: idx for idx, token in enumerate(ranked_tokens)}
+
+        def best_token(url_tokens):
+            ranks = [rank[token] for token in url_tokens if token in rank]
+            return ranked_tokens[min(ranks)] if ranks else None
+
+    else:
+
+        def best_token(url_tokens):
+            for token in ranked_tokens:
+                for url_token in url_tokens:
+                    if compare_func(token, url_token):
+                        return token
+            return None
+
     result = set()
-    for url_tokens in urls_tokens:
-        for token in relevant_tokens:
-            for url_token in url_tokens:
-                if (
-                    compare_func(
-                        token, url_token
-                    )  # check token against url_token token
-                    and token not in not_allowed
-                    # check token against not_allowed tokens
-                    and not any(
-                        [val in url_tokens for val in result]
-                    )  # check token against already found tokens
-                ):
-                    result.add(token)
-                    break
-            else:
-                continue  # Continue if the inner loop wasn't broken.
-            break  # Inner loop was broken, break the outer
+    best_tokens = {}  # urls with the same tokens have the same best token
+    for url_tokens in map(frozenset, urls_tokens):
+        if not result.isdisjoint(url_tokens):
+            continue  # url already contains a found token
+        if url_tokens not in best_tokens:
+            best_tokens[url_tokens] = best_token(url_tokens)
+        if best_tokens[url_tokens] is not None:
+            result.add(best_tokens[url_tokens])
     return list(result)
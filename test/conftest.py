@@ -20,6 +20,15 @@ sys.path.insert(0, 'src')
 
 os.environ['AWS_DEFAULT_REGION'] = 'us-east-1'
 
+from pytargetingutilities.aws.client_pool import ClientPool  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def reset_client_pool():
+    ClientPool.reset()
+    yield
+    ClientPool.reset()
+
 
 def add_dummy_data(
     bucket_name,
@@ -0,0 +1,69 @@
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from moto import mock_s3
+from pytargetingutilities.aws.client_pool import ClientPool
+
+
+class TestClientPool(unittest.TestCase):
+    def test_client_is_shared(self):
+        client = ClientPool.client('s3')
+        self.assertIs(client, ClientPool.client('s3'))
+        self.assertIsNot(client, ClientPool.client('s3', 'eu-west-1'))
+        self.assertIsNot(
+            client, ClientPool.client('s3', max_pool_connections=60)
+        )
+
+    def test_client_is_shared_between_threads(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(
+                executor.map(lambda _: ClientPool.client('ec2'), range(32))
+            )
+        self.assertEqual(len(set(map(id, clients))), 1)
+
+    def test_config(self):
+        defaults = ClientPool.max_pool_connections, ClientPool.retries
+        try:
+            ClientPool.configure(
+                max_pool_connections=25, retries={'max_attempts': 2}
+            )
+            config = ClientPool.client('s3').meta.config
+            self.assertEqual(config.max_pool_connections, 25)
+            self.assertEqual(config.retries['total_max_attempts'], 3)
+            config = ClientPool.client(
+                'ssm', max_pool_connections=60
+            ).meta.config
+            self.assertEqual(config.max_pool_connections, 60)
+        finally:
+            ClientPool.configure(*defaults)
+
+    @mock_s3
+    def test_inject_session(self):
+        session = boto3.session.Session(region_name='eu-central-1')
+        ClientPool.configure(session=session)
+        self.assertEqual(
+            ClientPool.client('s3').meta.region_name, 'eu-central-1'
+        )
+        ClientPool.reset()
+        self.assertEqual(ClientPool.client('s3').meta.region_name, 'us-east-1')
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_fork_drops_clients(self):
+        client = ClientPool.client('s3')
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # child
+            shared = ClientPool.client('s3') is client
+            os.write(write_end, b'1' if shared else b'0')
+            os._exit(0)
+        os.close(write_end)
+        self.assertEqual(os.read(read_end, 1), b'0')
+        os.close(read_end)
+        os.waitpid(pid, 0)
+        self.assertIs(ClientPool.client('s3'), client)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import bz2
+import gzip
+import unittest
+
+from pytargetingutilities.tools.codec import decompress_stream, detect, zstandard
+
+
+class TestCodec(unittest.TestCase):
+    data = b'\n'.join(b'line %d' % idx for idx in range(1000))
+
+    @staticmethod
+    def chunked(data, size=7):
+        return [data[idx:idx + size] for idx in range(0, len(data), size)]
+
+    def test_detect(self):
+        self.assertEqual(detect('file.json.gz'), 'gzip')
+        self.assertEqual(detect('file.BZ2'), 'bz2')
+        self.assertEqual(detect('file.zst'), 'zstd')
+        self.assertEqual(detect('file', gzip.compress(b'test')), 'gzip')
+        self.assertEqual(detect('file', bz2.compress(b'test')), 'bz2')
+        self.assertEqual(detect('file', bz2.compress(b'')), 'bz2')
+        self.assertEqual(detect('file', b'\x28\xb5\x2f\xfd\x00'), 'zstd')
+        self.assertIsNone(detect('file.json', b'BZh is not bz2'))
+
+    def test_plain(self):
+        codec, chunks = decompress_stream(self.chunked(self.data), 'file')
+        self.assertIsNone(codec)
+        self.assertEqual(b''.join(chunks), self.data)
+
+    def test_gzip_multi_member(self):
+        compressed = gzip.compress(self.data) + gzip.compress(self.data)
+        codec, chunks = decompress_stream(self.chunked(compressed), 'file')
+        self.assertEqual(codec, 'gzip')
+        self.assertEqual(b''.join(chunks), self.data + self.data)
+
+    def test_bz2(self):
+        compressed = bz2.compress(self.data)
+        codec, chunks = decompress_stream(
+            [b''] + self.chunked(compressed), 'file.bz2'
+        )
+        self.assertEqual(codec, 'bz2')
+        self.assertEqual(b''.join(chunks), self.data)
+
+    def test_empty(self):
+        codec, chunks = decompress_stream([], 'file.gz')
+        self.assertEqual(codec, 'gzip')
+        self.assertEqual(b''.join(chunks), b'')
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_zstd(self):
+        compressed = zstandard.ZstdCompressor().compress(self.data)
+        codec, chunks = decompress_stream(self.chunked(compressed), 'file')
+        self.assertEqual(codec, 'zstd')
+        self.assertEqual(b''.join(chunks), self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pytargetingutilities.tools import hash as hash_module
+from pytargetingutilities.tools.digest_cache import DigestCache
+from pytargetingutilities.tools.hash import hash_files, md5
+
+
+class TestDigestCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'data.bin')
+        with open(self.file_path, 'wb') as f:
+            f.write(b'test data')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_hit_and_miss(self):
+        cache = DigestCache()
+        self.assertEqual(md5(self.file_path, cache), 'eb733a00c0c9d336e65691a37ab54293')
+        with mock.patch(
+            'pytargetingutilities.tools.digest_cache.file_digest'
+        ) as file_digest:
+            self.assertEqual(
+                md5(self.file_path, cache), 'eb733a00c0c9d336e65691a37ab54293'
+            )
+            file_digest.assert_not_called()
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertIsNone(md5('doesnotexist.bin', cache))
+
+    def test_changed_file(self):
+        cache = DigestCache()
+        md5(self.file_path, cache)
+        with open(self.file_path, 'wb') as f:
+            f.write(b'other data')
+        os.utime(self.file_path, ns=(0, 1))
+        self.assertEqual(md5(self.file_path, cache), hash_module.md5(self.file_path))
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_persistent_and_custom_digest(self):
+        db_path = os.path.join(self.directory.name, 'digests.db')
+        DigestCache(db_path).digest(self.file_path, 'custom', lambda path: 'digest')
+        cache = DigestCache(db_path)
+        self.assertEqual(
+            cache.digest(self.file_path, 'custom', lambda path: 'other'), 'digest'
+        )
+        self.assertEqual(cache.hits, 1)
+
+    def test_lru_eviction(self):
+        cache = DigestCache(max_entries=2)
+        paths = []
+        for idx in range(3):
+            paths.append(os.path.join(self.directory.name, f'{idx}.bin'))
+            with open(paths[-1], 'wb') as f:
+                f.write(b'%d' % idx)
+        hash_files(paths[:2], workers=2, cache=cache)
+        cache.digest(paths[0])
+        cache.digest(paths[2])
+        self.assertEqual(len(cache), 2)
+        cache.digest(paths[0])
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+        cache.digest(paths[1])
+        self.assertEqual(cache.misses, 4)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
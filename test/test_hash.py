@@ -1,5 +1,15 @@
 import unittest
-from pytargetingutilities.tools.hash import md5
+import hashlib
+import io
+import os
+from unittest import mock
+from pytargetingutilities.tools.hash import (
+    HashingWriter,
+    file_digest,
+    hash_files,
+    md5,
+    s3_etag,
+)
 import tempfile
 
 
@@ -13,3 +23,97 @@ class TestHash(unittest.TestCase):
             temp.flush()
             my_hash = md5(temp.name)
             self.assertEqual(my_hash, 'eb733a00c0c9d336e65691a37ab54293')
+
+    def test_hashing_writer(self):
+        target = io.BytesIO()
+        writer = HashingWriter(target)
+        writer.write(b'test ')
+        writer.write(b'data')
+        self.assertEqual(target.getvalue(), b'test data')
+        self.assertEqual(writer.hexdigest(), 'eb733a00c0c9d336e65691a37ab54293')
+        writer = HashingWriter()
+        writer.write(b'test data')
+        self.assertEqual(writer.hexdigest(), 'eb733a00c0c9d336e65691a37ab54293')
+        writer.close()
+        self.assertTrue(writer.closed)
+        with self.assertRaises(ValueError):
+            writer.write(b'more')
+        with HashingWriter(target) as writer:
+            writer.write(b'!')
+        self.assertFalse(target.closed)
+        with HashingWriter(target, close_file=True) as writer:
+            writer.write(b'!')
+        self.assertTrue(target.closed)
+
+    def test_file_digest(self):
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        with tempfile.NamedTemporaryFile() as temp:
+            temp.write(data)
+            temp.flush()
+            self.assertEqual(
+                file_digest(temp.name, chunk_size=1000), hashlib.md5(data).hexdigest()
+            )
+            self.assertEqual(
+                file_digest(temp.name, 'sha256'), hashlib.sha256(data).hexdigest()
+            )
+
+    def test_hash_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, f'{idx}.bin') for idx in range(5)]
+            for idx, path in enumerate(paths):
+                with open(path, 'wb') as f:
+                    f.write(b'%d' % idx * 1000)
+            digests = hash_files(paths + ['doesnotexist.bin'], workers=3)
+            self.assertIsNone(digests.pop('doesnotexist.bin'))
+            self.assertDictEqual(digests, {path: md5(path) for path in paths})
+
+    def test_s3_etag(self):
+        mb = 1024 * 1024
+        data = os.urandom(11 * mb)
+        with tempfile.NamedTemporaryFile() as temp:
+            temp.write(data)
+            temp.flush()
+            self.assertEqual(s3_etag(temp.name), self.etag(data, 8 * mb))
+            self.assertEqual(
+                s3_etag(temp.name, 16 * mb), hashlib.md5(data).hexdigest()
+            )
+            # parts are at least 5 MB
+            self.assertEqual(
+                s3_etag(temp.name, 5 * mb, 1 * mb, workers=1),
+                self.etag(data, 5 * mb),
+            )
+            # the part size is doubled until there are at most MAX_PARTS parts
+            with mock.patch('pytargetingutilities.tools.hash.MAX_PARTS', 2):
+                self.assertEqual(
+                    s3_etag(temp.name, 5 * mb, 5 * mb), self.etag(data, 10 * mb)
+                )
+        self.assertIsNone(s3_etag('Pathtofilethatdoesnotexist.json'))
+
+    def test_s3_etag_short_reads(self):
+        class ShortReads(io.FileIO):
+            # like reads of more than about 2 GiB on linux
+            def read(self, size=-1):
+                return super().read(min(size, 1000))
+
+            def readinto(self, buffer):
+                return super().readinto(memoryview(buffer)[:1000])
+
+        mb = 1024 * 1024
+        data = os.urandom(11 * mb)
+        with tempfile.NamedTemporaryFile() as temp:
+            temp.write(data)
+            temp.flush()
+            with mock.patch(
+                'pytargetingutilities.tools.hash.open',
+                lambda path, *args, **kwargs: ShortReads(path),
+                create=True,
+            ):
+                self.assertEqual(s3_etag(temp.name), self.etag(data, 8 * mb))
+
+    @staticmethod
+    def etag(data, part_size):
+        parts = range(0, len(data), part_size)
+        digests = b''.join(
+            hashlib.md5(data[start:start + part_size]).digest() for start in parts
+        )
+        return f'{hashlib.md5(digests).hexdigest()}-{len(parts)}'
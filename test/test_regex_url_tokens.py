@@ -1,10 +1,34 @@
+import random
 import unittest
 from pytargetingutilities.urltokenizer.regex_url_tokenizer import (
     relevant_tokens,
     tokens,
+    tokens_batch,
+    tokens_cache_clear,
+    tokens_cache_info,
 )
 
 
+def legacy_relevant_tokens(urls, compare_func, not_allowed):
+    """ quadratic reference implementation of relevant_tokens """
+    urls_tokens = list(map(lambda x: tokens(x), urls))
+    all_tokens = [token for url_tokens in urls_tokens for token in url_tokens]
+    sorted_tokens = sorted(
+        [(x, all_tokens.count(x)) for x in set(all_tokens)],
+        key=lambda x: (x[1], len(x[0]), x[0]),
+        reverse=True,
+    )
+    result = set()
+    for url_tokens in urls_tokens:
+        for token, _ in sorted_tokens:
+            if token not in not_allowed and not any(
+                val in url_tokens for val in result
+            ) and any(compare_func(token, x) for x in url_tokens):
+                result.add(token)
+                break
+    return sorted(result)
+
+
 class TestRegexURLTokens(unittest.TestCase):
     def test_local_tokenizer(self):
         url_tokens = tokens('http://ebay.de/autos/luxus/de')
@@ -57,3 +81,41 @@ class TestRegexURLTokens(unittest.TestCase):
         assert tokens == ['elektroautos']
         tokens = relevant_tokens(urls2, not_allowed=['luxus', 'teslamag.de'])
         assert tokens == ['news']
+
+    def test_relevant_tokens_equals_reference(self):
+        rnd = random.Random(42)
+        words = ['auto', 'autos', 'spiele', 'games', 'news', 'luxus', 'tech']
+        urls = [
+            f'http://site{rnd.randint(0, 20)}.de/'
+            + '/'.join(rnd.sample(words, rnd.randint(0, 3)))
+            for _ in range(300)
+        ]
+        for compare_func in [lambda x, y: x == y, lambda x, y: x in y]:
+            for not_allowed in [[], ['autos', 'site1.de']]:
+                tokens = relevant_tokens(urls, compare_func, not_allowed=not_allowed)
+                self.assertListEqual(
+                    sorted(tokens),
+                    legacy_relevant_tokens(urls, compare_func, not_allowed),
+                )
+                self.assertListEqual(
+                    sorted(relevant_tokens(urls, not_allowed=not_allowed)),
+                    legacy_relevant_tokens(urls, lambda x, y: x == y, not_allowed),
+                )
+
+    def test_tokens_batch(self):
+        tokens_cache_clear()
+        urls = [
+            'http://ebay.de/autos/luxus/de',
+            'http://google.com/autos/luxus/deutschland',
+            'http://ebay.de/autos/luxus/de',
+            'http://ebay.de',
+        ]
+        url_tokens = tokens_batch(urls)
+        self.assertListEqual(url_tokens, [tokens(url) for url in urls])
+        info = tokens_cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 3))
+        flat_tokens, offsets = tokens_batch(urls, min_length=6, flat=True)
+        self.assertListEqual(offsets, [0, 1, 3, 4, 5])
+        self.assertListEqual(
+            flat_tokens[offsets[1]:offsets[2]], ['google.com', 'deutschland']
+        )
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import boto3
+from moto import mock_s3
+from pytargetingutilities.aws.s3.aio import AsyncS3Helper, iterate
+from pytargetingutilities.aws.s3.iterator import S3Iterator
+from pytargetingutilities.aws.s3.line_iterator import S3LineIterator
+import pytest
+
+
+class TestS3Aio(unittest.TestCase):
+    @mock_s3
+    def test_async_iteration(self):
+        pytest.create_bucket('test')
+        for idx in range(5):
+            pytest.add_dummy_data('test', f'file{idx}.txt', f'a{idx}\nb{idx}')
+
+        async def collect(iterable):
+            return [item async for item in iterable]
+
+        result = asyncio.run(collect(S3Iterator.paginator('test', prefetch=2)))
+        self.assertListEqual(result, [f'a{i}\nb{i}' for i in range(5)])
+        lines = asyncio.run(collect(S3LineIterator.paginator('test')))
+        self.assertListEqual(
+            lines, [x for i in range(5) for x in (f'a{i}', f'b{i}')]
+        )
+
+    def test_iterate_closes_iterator(self):
+        closed = []
+
+        def numbers():
+            try:
+                yield from range(100)
+            finally:
+                closed.append(True)
+
+        async def first_three():
+            items = iterate(numbers(), batch_size=10)
+            result = [await items.__anext__() for _ in range(3)]
+            await items.aclose()
+            # closed by the background thread once its batch is done
+            for _ in range(100):
+                if closed:
+                    break
+                await asyncio.sleep(0.01)
+            return result
+
+        self.assertListEqual(asyncio.run(first_three()), [0, 1, 2])
+        self.assertListEqual(closed, [True])
+
+    @mock_s3
+    def test_read_download_write(self):
+        pytest.create_bucket('test')
+        for idx in range(20):
+            pytest.add_dummy_data('test', f'key{idx:02}', f'body{idx}')
+
+        def writer(path):
+            with open(path, 'w') as f:
+                f.write('written')
+
+        async def run(directory):
+            async with AsyncS3Helper(max_concurrency=4, chunk_size=2) as s3:
+                body = await s3.read('test', 'key01')
+                bodies = [
+                    item async for item in s3.read_many(
+                        'test', [f'key{idx:02}' for idx in range(20)]
+                    )
+                ]
+                await s3.download(
+                    'test', 'key02', os.path.join(directory, 'key02')
+                )
+                await s3.write('test', 'out/written.txt', writer)
+                return body, bodies
+
+        with tempfile.TemporaryDirectory() as directory:
+            body, bodies = asyncio.run(run(directory))
+            self.assertEqual(body, b'body1')
+            self.assertListEqual(
+                bodies,
+                [(f'key{idx:02}', f'body{idx}'.encode()) for idx in range(20)],
+            )
+            with open(os.path.join(directory, 'key02')) as f:
+                self.assertEqual(f.read(), 'body2')
+            self.assertListEqual(os.listdir(directory), ['key02'])
+        written = boto3.client('s3').get_object(
+            Bucket='test', Key='out/written.txt'
+        )['Body'].read()
+        self.assertEqual(written, b'written')
+
+    @mock_s3
+    def test_concurrency_is_bounded(self):
+        pytest.create_bucket('test')
+        pytest.add_dummy_data('test', 'key', 'x' * 100)
+        running = []
+        peak = []
+
+        async def run():
+            s3 = AsyncS3Helper(max_concurrency=2, chunk_size=10)
+            _get = s3._get
+
+            async def tracked_get(*args):
+                running.append(1)
+                peak.append(len(running))
+                try:
+                    await _get(*args)
+                finally:
+                    running.pop()
+
+            s3._get = tracked_get
+            await asyncio.gather(*[s3.read('test', 'key') for _ in range(6)])
+            s3.close()
+
+        asyncio.run(run())
+        self.assertEqual(max(peak), 2)
+
+    @mock_s3
+    def test_cancelled_download_leaves_no_file(self):
+        pytest.create_bucket('test')
+        pytest.add_dummy_data('test', 'key', 'x' * 100_000)
+
+        async def run(destination):
+            s3 = AsyncS3Helper(chunk_size=1)
+            task = asyncio.ensure_future(
+                s3.download('test', 'key', destination)
+            )
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            s3.close()
+
+        with tempfile.TemporaryDirectory() as directory:
+            asyncio.run(run(os.path.join(directory, 'key')))
+            self.assertListEqual(os.listdir(directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from moto import mock_s3
+from pytargetingutilities.aws.s3 import filters
+from pytargetingutilities.aws.s3.iterator import S3Iterator
+import pytest
+
+NOW = datetime(2024, 5, 1, tzinfo=timezone.utc)
+ITEMS = [
+    {'Key': 'logs/2024/part-1.gz', 'Size': 10, 'LastModified': NOW},
+    {
+        'Key': 'logs/2023/part-2.json',
+        'Size': 2000,
+        'LastModified': NOW - timedelta(days=200),
+        'StorageClass': 'GLACIER',
+    },
+    {'Key': 'data/x.json', 'Size': 0, 'LastModified': NOW - timedelta(days=1)},
+]
+
+
+def keys(predicate):
+    return [item['Key'] for item in filter(predicate, ITEMS)]
+
+
+class TestS3Filters(unittest.TestCase):
+    def test_key_predicates(self):
+        self.assertListEqual(
+            keys(filters.prefix('logs/')),
+            ['logs/2024/part-1.gz', 'logs/2023/part-2.json'],
+        )
+        self.assertListEqual(
+            keys(filters.suffix('.gz', '.bz2')), ['logs/2024/part-1.gz']
+        )
+        self.assertListEqual(
+            keys(filters.regex(r'/\d{4}/part-2')), ['logs/2023/part-2.json']
+        )
+        self.assertListEqual(
+            keys(filters.glob('logs/*/part-*.json')), ['logs/2023/part-2.json']
+        )
+
+    def test_metadata_predicates(self):
+        self.assertListEqual(
+            keys(filters.size_between(1, 1000)), ['logs/2024/part-1.gz']
+        )
+        self.assertListEqual(
+            keys(filters.size_between(max_size=10)),
+            ['logs/2024/part-1.gz', 'data/x.json'],
+        )
+        self.assertListEqual(
+            keys(filters.modified_between(after=datetime(2024, 4, 30))),
+            ['logs/2024/part-1.gz', 'data/x.json'],
+        )
+        self.assertListEqual(
+            keys(filters.modified_between(NOW - timedelta(days=300), NOW)),
+            ['logs/2023/part-2.json', 'data/x.json'],
+        )
+        self.assertListEqual(
+            keys(filters.storage_class('GLACIER')), ['logs/2023/part-2.json']
+        )
+
+    def test_empty_arguments(self):
+        self.assertIsNone(filters.modified_between())
+        self.assertListEqual(
+            keys(filters.all_of(filters.modified_between())),
+            [item['Key'] for item in ITEMS],
+        )
+        with self.assertRaises(ValueError):
+            filters.prefix()
+        with self.assertRaises(ValueError):
+            filters.suffix()
+        with self.assertRaises(ValueError):
+            filters.storage_class()
+        self.assertIsNone(filters.negate(filters.modified_between()))
+        self.assertIsNone(filters.any_of(filters.modified_between()))
+        predicate = filters.any_of(
+            filters.modified_between(), filters.prefix('data/')
+        )
+        self.assertListEqual(keys(predicate), ['data/x.json'])
+
+    def test_composition(self):
+        self.assertIsNone(filters.all_of(None))
+        predicate = filters.all_of(
+            filters.suffix('.json'),
+            filters.negate(filters.storage_class('GLACIER')),
+        )
+        self.assertListEqual(keys(predicate), ['data/x.json'])
+        predicate = filters.any_of(
+            filters.prefix('data/'), lambda item: item['Size'] > 1000
+        )
+        self.assertListEqual(
+            keys(predicate), ['logs/2023/part-2.json', 'data/x.json']
+        )
+
+    @mock_s3
+    def test_paginator_filters(self):
+        pytest.create_bucket('test')
+        pytest.add_dummy_data('test', 'a/1.json', '1')
+        pytest.add_dummy_data('test', 'a/2.json', '22')
+        pytest.add_dummy_data('test', 'b/3.csv', '333')
+        pytest.add_dummy_data(
+            'test', 'b/4.json', '4444', NOW.replace(year=2000)
+        )
+        result = S3Iterator.paginator(
+            'test', max_items=1, filters=[filters.size_between(min_size=2)]
+        ).aggregate()
+        self.assertListEqual(result, ['22', '333', '4444'])
+        result = S3Iterator.date_paginator(
+            'test',
+            2,
+            ends_with='.json',
+            filters=[filters.negate(filters.prefix('a/1'))],
+        ).aggregate()
+        self.assertListEqual(result, ['22'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
+import os
+import tempfile
 import unittest
 
+import boto3
 import pytest
 from moto import mock_s3
 from pytargetingutilities.aws.s3.helper import S3Helper
@@ -36,6 +39,53 @@ class TestS3Helper(unittest.TestCase):
         )
         self.assertEqual(latest_directory, 'newer/5582')
 
+    @mock_s3
+    def test_get_latest_directory_paginated(self):
+        pytest.create_bucket('test')
+        s3 = boto3.client('s3')
+        for idx in range(1010):
+            s3.put_object(Bucket='test', Key=f'a/{idx:04}/x.json', Body=b'')
+        pytest.add_dummy_data('test', 'a/1005/x.json', '', pytest.get_date(-1))
+        pytest.add_dummy_data('test', 'a/1006/x.json', '', pytest.get_date(1))
+        for workers in (1, 4):
+            self.assertEqual(
+                S3Helper.get_latest_directory('test', 'a', workers=workers),
+                'a/1005',
+            )
+        self.assertIsNone(
+            S3Helper.get_latest_directory('test', 'b/', workers=4)
+        )
+
+    @mock_s3
+    def test_get_latest_directory_parallel(self):
+        pytest.create_bucket('test')
+        pytest.add_dummy_data('test', 'top.json', '', pytest.get_date(3))
+        pytest.add_dummy_data('test', 'x/1/a.json', '', pytest.get_date(2))
+        pytest.add_dummy_data('test', 'y/2/b.json', '', pytest.get_date(1))
+        pytest.add_dummy_data('test', 'y/3/c.json', '', pytest.get_date(5))
+        self.assertEqual(
+            S3Helper.get_latest_directory('test', workers=4), 'y/2'
+        )
+        pytest.add_dummy_data('test', 'newest.json', '', pytest.get_date(0))
+        self.assertEqual(S3Helper.get_latest_directory('test', workers=4), '')
+
+    @mock_s3
+    def test_get_latest_directory_cached(self):
+        pytest.create_bucket('test')
+        S3Helper.clear_latest_directory_cache()
+        pytest.add_dummy_data('test', 'd/1/a.json', '', pytest.get_date(2))
+        self.assertEqual(
+            S3Helper.get_latest_directory_cached('test', 'd/', ttl=60), 'd/1'
+        )
+        pytest.add_dummy_data('test', 'd/2/a.json', '', pytest.get_date(1))
+        self.assertEqual(
+            S3Helper.get_latest_directory_cached('test', 'd/', ttl=60), 'd/1'
+        )
+        self.assertEqual(
+            S3Helper.get_latest_directory_cached('test', 'd/', ttl=0), 'd/2'
+        )
+        S3Helper.clear_latest_directory_cache()
+
     @mock_s3
     def test_object_newer_than_isnewer(self):
         pytest.create_bucket('test')
@@ -69,6 +119,102 @@ class TestS3Helper(unittest.TestCase):
             "test", "test/file/jay.son", older_date
         ))
 
+    @mock_s3
+    def test_download_latest(self):
+        pytest.create_bucket('test')
+        # moto keeps last_modified as naive UTC datetime and compares it with
+        # the parsed If-Modified-Since header, so the object gets a naive one
+        pytest.add_dummy_data(
+            'test', 'model.bin', 'v1', pytest.get_date(1).replace(tzinfo=None)
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            destination = os.path.join(directory, 'model.bin')
+            self.assertFalse(S3Helper.download_latest(
+                'test', 'model.bin', destination, pytest.get_date(0)
+            ))
+            self.assertFalse(os.path.exists(destination))
+            self.assertTrue(S3Helper.download_latest(
+                'test', 'model.bin', destination, pytest.get_date(2)
+            ))
+            with open(destination) as f:
+                self.assertEqual(f.read(), 'v1')
+            self.assertTrue(
+                os.path.exists(os.path.join(directory, '.model.bin.s3state'))
+            )
+            # newer than timestamp, so it is written again
+            self.assertTrue(S3Helper.download_latest(
+                'test', 'model.bin', destination, pytest.get_date(2)
+            ))
+            # unless the etag is unchanged and skip_unchanged is set
+            self.assertFalse(S3Helper.download_latest(
+                'test', 'model.bin', destination, pytest.get_date(2), True
+            ))
+            pytest.add_dummy_data('test', 'model.bin', 'v2', None)
+            self.assertTrue(S3Helper.download_latest(
+                'test', 'model.bin', destination, pytest.get_date(2), True
+            ))
+            with open(destination) as f:
+                self.assertEqual(f.read(), 'v2')
+            os.remove(destination)
+            self.assertTrue(S3Helper.download_latest(
+                'test', 'model.bin', destination, pytest.get_date(2), True
+            ))
+            self.assertListEqual(
+                sorted(os.listdir(directory)),
+                ['.model.bin.s3state', 'model.bin'],
+            )
+
+    @mock_s3
+    def test_download_directory(self):
+        pytest.create_bucket('test')
+        pytest.add_dummy_data('test', 'model/a.bin', 'a', pytest.get_date(1))
+        pytest.add_dummy_data('test', 'model/sub/b.bin', 'bb', pytest.get_date(2))
+        pytest.add_dummy_data('test', 'other/c.bin', 'c')
+        with tempfile.TemporaryDirectory() as directory:
+            report = S3Helper.download_directory(
+                'test', 'model/', directory, workers=2
+            )
+            self.assertListEqual(
+                sorted(report['downloaded']), ['model/a.bin', 'model/sub/b.bin']
+            )
+            self.assertEqual(report['downloaded_bytes'], 3)
+            with open(os.path.join(directory, 'sub', 'b.bin')) as f:
+                self.assertEqual(f.read(), 'bb')
+            with open(os.path.join(directory, 'a.bin'), 'w') as f:
+                f.write('x')  # same size, but other content and mtime
+            report = S3Helper.download_directory('test', 'model/', directory)
+            self.assertListEqual(report['downloaded'], ['model/a.bin'])
+            self.assertListEqual(report['skipped'], ['model/sub/b.bin'])
+            with open(os.path.join(directory, 'a.bin')) as f:
+                self.assertEqual(f.read(), 'a')
+            report = S3Helper.download_directory(
+                'test', 'model/', directory, only_newer=False
+            )
+            self.assertEqual(len(report['downloaded']), 2)
+            self.assertListEqual(
+                sorted(os.listdir(directory)), ['a.bin', 'sub']
+            )
+
+    @mock_s3
+    def test_download_directory_stays_inside(self):
+        pytest.create_bucket('test')
+        pytest.add_dummy_data('test', 'model/a.bin', 'a')
+        pytest.add_dummy_data('test', 'model/../escaped.txt', 'x')
+        pytest.add_dummy_data('test', 'model/sub/../../up.txt', 'x')
+        pytest.add_dummy_data('test', 'modelx/b.bin', 'b')
+        with tempfile.TemporaryDirectory() as parent:
+            directory = os.path.join(parent, 'mirror')
+            report = S3Helper.download_directory('test', 'model/', directory)
+            self.assertListEqual(report['downloaded'], ['model/a.bin'])
+            self.assertListEqual(
+                sorted(report['rejected']),
+                ['model/../escaped.txt', 'model/sub/../../up.txt'],
+            )
+            self.assertListEqual(os.listdir(parent), ['mirror'])
+            self.assertListEqual(os.listdir(directory), ['a.bin'])
+            with self.assertRaises(AttributeError):
+                S3Helper.download_directory('test', 'model', directory)
+
 
 if __name__ == '__main__':
     unittest.main()
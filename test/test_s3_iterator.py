@@ -1,4 +1,6 @@
+import gzip
 import unittest
+from unittest import mock
 from datetime import datetime, timedelta, timezone
 
 import boto3
@@ -88,6 +90,118 @@ class TestS3Iterator(unittest.TestCase):
         result = [item for item in my_iter]
         self.assertEqual(len(result), 1)
 
+    @mock_s3
+    def test_prefetch_keeps_key_order(self):
+        bucket_name = 'test'
+        con = boto3.client('s3', region_name='us-east-1')
+        con.create_bucket(Bucket=bucket_name)
+        for idx in range(20):
+            pytest.add_dummy_data(bucket_name, f'file{idx:02}.json', f'{idx}')
+        result = S3Iterator.paginator(
+            bucket_name, 3, prefetch=4, workers=2
+        ).aggregate()
+        self.assertListEqual(result, [f'{idx}' for idx in range(20)])
+
+    @mock_s3
+    def test_prefetch_propagates_errors(self):
+        bucket_name = 'test'
+        con = boto3.client('s3', region_name='us-east-1')
+        con.create_bucket(Bucket=bucket_name)
+        pytest.add_dummy_data(bucket_name, 'file1.json', 'test1')
+        pytest.add_dummy_data(bucket_name, 'file2.json', b'\xff')
+        pytest.add_dummy_data(bucket_name, 'file3.json', 'test3')
+        my_iter = iter(S3Iterator.paginator(bucket_name, prefetch=2))
+        self.assertEqual(next(my_iter), 'test1')
+        with self.assertRaises(UnicodeDecodeError):
+            next(my_iter)
+        self.assertEqual(next(my_iter), 'test3')
+        with self.assertRaises(StopIteration):
+            next(my_iter)
+
+    @mock_s3
+    def test_listing_is_lazy(self):
+        item_length = 5
+        bucket_name = 'test'
+        self.add_s3_data(item_length, bucket_name)
+        pages = []
+
+        def tracked_pages(listing):
+            for page in listing:
+                pages.append(page)
+                yield page
+
+        my_iter = S3Iterator.paginator(bucket_name, max_items=1)
+        my_iter._pages = tracked_pages(my_iter._pages)
+        next(iter(my_iter))
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(len(my_iter.aggregate()), item_length - 1)
+
+    @mock_s3
+    def test_list_ahead_with_prefetch(self):
+        item_length = 15
+        bucket_name = 'test'
+        self.add_s3_data(item_length, bucket_name)
+        result = S3Iterator.paginator(
+            bucket_name, max_items=2, list_ahead=3, prefetch=4
+        ).aggregate()
+        self.assertEqual(len(result), item_length)
+
+    @mock_s3
+    def test_empty_listing(self):
+        pytest.create_bucket('test')
+        result = S3Iterator.paginator('test', ends_with='.json').aggregate()
+        self.assertListEqual(result, [])
+
+    @mock_s3
+    def test_sharded_listing(self):
+        pytest.create_bucket('test')
+        keys = [
+            'a.json', 'b/1.json', 'b/2.txt', 'c.json', 'd/1/x.json',
+            'd/2.json', 'e/1.json',
+        ]
+        for key in keys:
+            pytest.add_dummy_data('test', key, key)
+        expected = [key for key in keys if key.endswith('.json')]
+        for shards in ('prefixes', ['b/2.txt', 'c', 'd/2.json']):
+            result = S3Iterator.paginator(
+                'test', max_items=1, ends_with='.json', shards=shards,
+                shard_workers=2,
+            ).aggregate()
+            self.assertListEqual(result, expected)
+            result = S3Iterator.paginator(
+                'test', shards=shards, ordered=False
+            ).aggregate()
+            self.assertListEqual(sorted(result), keys)
+        result = S3Iterator.date_paginator(
+            'test', 1, directory='d/', shards='prefixes'
+        ).aggregate()
+        self.assertListEqual(result, ['d/1/x.json', 'd/2.json'])
+        with self.assertRaises(ValueError):
+            S3Iterator.paginator('test', shards='prefixes', continuation_token='x')
+
+    @mock_s3
+    def test_sharded_listing_flat_prefix(self):
+        pytest.create_bucket('test')
+        keys = [f'flat/{idx}.json' for idx in range(5)]
+        for key in keys:
+            pytest.add_dummy_data('test', key, key)
+        with mock.patch(
+            'pytargetingutilities.aws.s3.base_paginator.read_shards'
+        ) as read_shards:
+            result = S3Iterator.paginator(
+                'test', max_items=2, directory='flat/', shards='prefixes'
+            ).aggregate()
+        self.assertListEqual(result, keys)
+        read_shards.assert_not_called()
+
+    @mock_s3
+    def test_compressed_objects(self):
+        pytest.create_bucket('test')
+        pytest.add_dummy_data('test', 'file1.json.gz', gzip.compress(b'test1'))
+        pytest.add_dummy_data('test', 'file2.json', gzip.compress(b'test2'))
+        result = S3Iterator.paginator('test').aggregate()
+        self.assertListEqual(result, ['test1', 'test2'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,12 +1,21 @@
+import bz2
+import gzip
+import json
+import os
+import tempfile
 import unittest
 from datetime import datetime, timedelta, timezone
 from typing import List
+from unittest import mock
 
+from botocore.exceptions import ClientError, EndpointConnectionError
 from moto import mock_s3
 import boto3
 import pytest
 
-from pytargetingutilities.aws.s3.line_iterator import S3LineIterator
+from pytargetingutilities.aws.s3.line_iterator import S3LineIterator, iter_lines
+
+PATCHED_CLIENT = 'pytargetingutilities.aws.s3.line_iterator.ClientPool.client'
 
 
 class TestS3LineIterator(unittest.TestCase):
@@ -159,13 +168,25 @@ class TestS3LineIterator(unittest.TestCase):
             _ = S3LineIterator.paginator(bucket_name)[8]
 
     @mock_s3
-    def test_slicing_not_implemented_iter_subscript(self):
-        item_length = [4, 8]
+    def test_iter(self):
+        item_length = [4, 0, 8]
         bucket_name = 'test'
         self.add_s3_data(item_length, bucket_name)
-        with self.assertRaises(NotImplementedError):
-            for _ in S3LineIterator.paginator(bucket_name):
-                pass
+        s3iter = S3LineIterator.paginator(bucket_name)
+        self.assertListEqual([line for line in s3iter], s3iter[:])
+
+    @mock_s3
+    def test_iter_batches(self):
+        item_length = [4, 0, 8]
+        bucket_name = 'test'
+        self.add_s3_data(item_length, bucket_name)
+        s3iter = S3LineIterator.paginator(bucket_name)
+        batches = list(s3iter.iter_batches(5))
+        self.assertListEqual([len(batch) for batch in batches], [5, 5, 2])
+        self.assertEqual(batches[0][-1], 'testdata 2, 0')
+        self.assertListEqual(list(s3iter.iter_batches(5, prefetch=3)), batches)
+        with self.assertRaises(ValueError):
+            next(s3iter.iter_batches(0))
 
     @mock_s3
     def test_slicing_not_implemented_ste(self):
@@ -174,3 +195,249 @@ class TestS3LineIterator(unittest.TestCase):
         self.add_s3_data(item_length, bucket_name)
         with self.assertRaises(NotImplementedError):
             _ = S3LineIterator.paginator(bucket_name)[8:12:2]
+
+    @mock_s3
+    def test_manifest_local_file(self):
+        item_length = [4, 8]
+        bucket_name = 'test'
+        self.add_s3_data(item_length, bucket_name)
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = os.path.join(directory, 'manifest.json')
+            s3iter = S3LineIterator.paginator(bucket_name, manifest=manifest)
+            self.assertEqual(len(s3iter), sum(item_length))
+            with open(manifest) as f:
+                entries = json.load(f)['objects']
+            self.assertListEqual([4, 8], [entry['lines'] for entry in entries])
+            self.assertListEqual([0, 4], [entry['line0'] for entry in entries])
+            with mock.patch.object(S3LineIterator, '_object_len') as object_len:
+                s3iter = S3LineIterator.paginator(bucket_name, manifest=manifest)
+                self.assertEqual(len(s3iter), sum(item_length))
+                object_len.assert_not_called()
+            self.assertListEqual(s3iter[3:5], ['testdata 0, 3', 'testdata 1, 0'])
+
+    @mock_s3
+    def test_manifest_refresh_on_changed_etag(self):
+        item_length = [4, 8]
+        bucket_name = 'test'
+        self.add_s3_data(item_length, bucket_name)
+        manifest = f's3://{bucket_name}-manifest/lines.json'
+        pytest.create_bucket(f'{bucket_name}-manifest')
+        len(S3LineIterator.paginator(bucket_name, manifest=manifest))
+        key = S3LineIterator.paginator(bucket_name)._keys[0]
+        pytest.add_dummy_data(bucket_name, key, 'changed')
+        with mock.patch.object(
+            S3LineIterator, '_object_len', return_value=1
+        ) as object_len:
+            s3iter = S3LineIterator.paginator(bucket_name, manifest=manifest)
+            self.assertEqual(len(s3iter), 9)
+            object_len.assert_called_once_with(key)
+        s3iter = S3LineIterator.paginator(bucket_name, manifest=manifest)
+        self.assertEqual(len(s3iter), 9)
+
+    @mock_s3
+    def test_offset_index_slices(self):
+        item_length = [10, 0, 7]
+        bucket_name = 'test'
+        self.add_s3_data(item_length, bucket_name)
+        expected = S3LineIterator.paginator(bucket_name)[:]
+        s3iter = S3LineIterator.paginator(bucket_name, index_every=3)
+        for start in range(0, 17):
+            for stop in range(start + 1, 19):
+                self.assertListEqual(s3iter[start:stop], expected[start:stop])
+
+    @mock_s3
+    def test_offset_index_uses_ranges(self):
+        item_length = [20]
+        bucket_name = 'test'
+        self.add_s3_data(item_length, bucket_name)
+        s3iter = S3LineIterator.paginator(bucket_name, index_every=4)
+        with mock.patch.object(
+            s3iter, '_object_chunks', wraps=s3iter._object_chunks
+        ) as object_chunks:
+            lines = s3iter[9:11]
+        self.assertListEqual(lines, ['testdata 0, 9', 'testdata 0, 10'])
+        _, byte_start, byte_stop = object_chunks.call_args[0]
+        # checkpoints of the lines 8 and 12
+        self.assertEqual(byte_start, 8 * len('testdata 0, 8\n'))
+        self.assertEqual(
+            byte_stop, 10 * len('testdata 0, 9\n') + 2 * len('testdata 0, 10\n')
+        )
+
+    def test_iter_lines(self):
+        chunks = [b'ab\r', b'\ncd\n', b'\n', b'ef']
+        self.assertListEqual(
+            list(iter_lines(chunks)), [(0, b'ab'), (4, b'cd'), (7, b''), (8, b'ef')]
+        )
+
+    @mock_s3
+    def test_parallel_counting(self):
+        item_length = [5, 3, 0, 4, 8, 1]
+        bucket_name = 'test'
+        self.add_s3_data(item_length, bucket_name)
+        progress = []
+        s3iter = S3LineIterator.paginator(
+            bucket_name, workers=4, progress_hook=lambda *args: progress.append(args)
+        )
+        self.assertEqual(len(s3iter), sum(item_length))
+        self.assertListEqual(
+            [line0 for _, _, line0 in s3iter._key_len_map], [0, 5, 8, 8, 12, 20]
+        )
+        self.assertListEqual(
+            sorted(lines for _, lines, _ in progress), sorted(item_length)
+        )
+        self.assertGreater(s3iter.counting_seconds, 0)
+        self.assertListEqual(s3iter[4:6], ['testdata 0, 4', 'testdata 1, 0'])
+
+    @mock_s3
+    def test_compressed_objects(self):
+        bucket_name = 'test'
+        pytest.create_bucket(bucket_name)
+        data = '\n'.join(f'testdata {idx}' for idx in range(10)).encode()
+        pytest.add_dummy_data(bucket_name, 'a.json.gz', gzip.compress(data))
+        # detected by magic bytes
+        pytest.add_dummy_data(bucket_name, 'b.json', bz2.compress(data))
+        pytest.add_dummy_data(bucket_name, 'c.json', data)
+        s3iter = S3LineIterator.paginator(bucket_name, index_every=4)
+        self.assertEqual(len(s3iter), 30)
+        self.assertListEqual(s3iter._offsets['a.json.gz'], [])
+        self.assertEqual(len(s3iter._offsets['c.json']), 3)
+        self.assertListEqual(
+            s3iter[8:12], ['testdata 8', 'testdata 9', 'testdata 0', 'testdata 1']
+        )
+        self.assertListEqual(s3iter[25:27], ['testdata 5', 'testdata 6'])
+        self.assertListEqual(list(s3iter)[9:11], ['testdata 9', 'testdata 0'])
+
+    @mock_s3
+    def test_select_client_side(self):
+        bucket_name = 'test'
+        pytest.create_bucket(bucket_name)
+        records = [
+            {'id': idx, 'country': 'de' if idx % 2 else 'fr'} for idx in range(6)
+        ]
+        data = '\n'.join(json.dumps(record) for record in records).encode()
+        pytest.add_dummy_data(bucket_name, 'a.json', data)
+        pytest.add_dummy_data(bucket_name, 'b.json.gz', gzip.compress(data))
+        pytest.add_dummy_data(bucket_name, 'c.csv', b'id,country\n1,de\n2,fr\n')
+        s3iter = S3LineIterator.paginator(bucket_name, ends_with='.gz')
+        # moto does not implement S3 Select, so the objects are filtered client-side
+        lines = list(s3iter.select(field='country', value='de'))
+        self.assertListEqual([json.loads(line)['id'] for line in lines], [1, 3, 5])
+        self.assertEqual(s3iter.select_stats['filtered_locally'], 1)
+        self.assertEqual(s3iter.select_stats['bytes_processed'], len(data) + 1)
+        self.assertEqual(
+            s3iter.select_stats['bytes_returned'], sum(len(line) + 1 for line in lines)
+        )
+        s3iter = S3LineIterator.paginator(bucket_name)
+        lines = list(s3iter.select(contains='"id": 4', pushdown=False))
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(s3iter.select_stats['pushed_down'], 0)
+        s3iter = S3LineIterator.paginator(bucket_name, ends_with='.csv')
+        lines = s3iter.select(field='country', value='fr', input_format='csv')
+        self.assertListEqual(list(lines), ['2,fr'])
+        lines = s3iter.select(contains='d', input_format='csv')
+        self.assertListEqual(list(lines), ['1,de'])
+        with self.assertRaises(ValueError):
+            list(s3iter.select())
+        # lines that are no JSON objects do not match
+        data = b'[1]\n42\n"de"\n{"country": "de"\n{"country": "de"}\n'
+        pytest.add_dummy_data(bucket_name, 'd.json', data)
+        s3iter = S3LineIterator.paginator(bucket_name, ends_with='d.json')
+        self.assertListEqual(
+            list(s3iter.select(field='country', value='de', pushdown=False)),
+            ['{"country": "de"}'],
+        )
+
+    @mock_s3
+    def test_select_pushdown(self):
+        bucket_name = 'test'
+        pytest.create_bucket(bucket_name)
+        data = b'{"x": 1}\n{"x": 2}\n{"x": 1}\n'
+        pytest.add_dummy_data(bucket_name, 'a.json', data)
+        s3iter = S3LineIterator.paginator(bucket_name, ends_with='.json')
+        events = [
+            {'Records': {'Payload': b'{"x":1}\n{"'}},
+            {'Records': {'Payload': b'x":1}\n'}},
+            {
+                'Stats': {
+                    'Details': {
+                        'BytesScanned': 27,
+                        'BytesProcessed': 27,
+                        'BytesReturned': 16,
+                    }
+                }
+            },
+            {'End': {}},
+        ]
+        client = mock.Mock()
+        client.select_object_content.return_value = {'Payload': iter(events)}
+        with mock.patch(PATCHED_CLIENT, return_value=client):
+            lines = list(s3iter.select(field='x', value=1))
+        self.assertListEqual(lines, ['{"x":1}', '{"x":1}'])
+        self.assertEqual(
+            client.select_object_content.call_args.kwargs['Expression'],
+            'SELECT * FROM S3Object s WHERE s."x" = 1',
+        )
+        self.assertEqual(
+            s3iter.select_stats,
+            {
+                'bytes_scanned': 27,
+                'bytes_processed': 27,
+                'bytes_returned': 16,
+                'pushed_down': 1,
+                'filtered_locally': 0,
+            },
+        )
+
+    @mock_s3
+    def test_select_does_not_count(self):
+        bucket_name = 'test'
+        pytest.create_bucket(bucket_name)
+        for name in 'ab':
+            pytest.add_dummy_data(
+                bucket_name, f'{name}.json', b'{"x": 1}\n{"x": 2}\n'
+            )
+        client = mock.Mock(wraps=boto3.client('s3'))
+        client.select_object_content.side_effect = lambda **_: {
+            'Payload': iter([{'Records': {'Payload': b'{"x":1}\n'}}])
+        }
+        with mock.patch(PATCHED_CLIENT, return_value=client):
+            s3iter = S3LineIterator.paginator(bucket_name)
+            lines = list(s3iter.select(field='x', value=1))
+        self.assertListEqual(lines, ['{"x":1}', '{"x":1}'])
+        client.get_object.assert_not_called()
+        self.assertIsNone(s3iter._key_len_map)
+        self.assertEqual(len(s3iter), 4)
+
+    @mock_s3
+    def test_select_errors(self):
+        bucket_name = 'test'
+        pytest.create_bucket(bucket_name)
+        for name in 'abc':
+            pytest.add_dummy_data(
+                bucket_name, f'{name}.json', b'{"x": 1}\n{"x": 2}\n'
+            )
+        s3iter = S3LineIterator.paginator(bucket_name)
+        client = mock.Mock(wraps=boto3.client('s3'))
+
+        def error(code):
+            return ClientError({'Error': {'Code': code}}, 'SelectObjectContent')
+
+        # a rejected object is filtered locally, pushdown continues for the others
+        client.select_object_content.side_effect = error('InvalidTextEncoding')
+        with mock.patch(PATCHED_CLIENT, return_value=client):
+            self.assertEqual(len(list(s3iter.select(field='x', value=1))), 3)
+        self.assertEqual(client.select_object_content.call_count, 3)
+        # an endpoint without S3 Select disables pushdown for the remaining objects
+        client.select_object_content.reset_mock()
+        client.select_object_content.side_effect = error('NotImplemented')
+        with mock.patch(PATCHED_CLIENT, return_value=client):
+            self.assertEqual(len(list(s3iter.select(field='x', value=1))), 3)
+        self.assertEqual(client.select_object_content.call_count, 1)
+        self.assertEqual(s3iter.select_stats['filtered_locally'], 3)
+        # transient errors are raised
+        client.select_object_content.side_effect = EndpointConnectionError(
+            endpoint_url='http://s3'
+        )
+        with mock.patch(PATCHED_CLIENT, return_value=client):
+            with self.assertRaises(EndpointConnectionError):
+                list(s3iter.select(field='x', value=1))
@@ -0,0 +1,50 @@
+import hashlib
+import unittest
+
+import boto3
+import pytest
+from moto import mock_s3
+from pytargetingutilities.aws.s3.helper import S3Helper
+from pytargetingutilities.aws.s3.multipart import MB, MultipartWriter
+
+
+class TestMultipartWriter(unittest.TestCase):
+    @mock_s3
+    def test_small_object(self):
+        pytest.create_bucket('test')
+        with MultipartWriter('test', 'small.txt') as writer:
+            writer.write(b'test ')
+            writer.write(b'data')
+        self.assertEqual(S3Helper.read('test', 'small.txt'), b'test data')
+        self.assertEqual(writer.hexdigest(), hashlib.md5(b'test data').hexdigest())
+
+    @mock_s3
+    def test_multipart_object(self):
+        pytest.create_bucket('test')
+        data = bytes(range(256)) * (44 * 1024)  # 11 MB
+        with MultipartWriter(
+            'test', 'large.bin', part_size=5 * MB, workers=1
+        ) as writer:
+            for idx in range(0, len(data), 1000 * 1000):
+                writer.write(data[idx:idx + 1000 * 1000])
+        self.assertEqual(S3Helper.read('test', 'large.bin'), data)
+        self.assertEqual(writer.hexdigest(), hashlib.md5(data).hexdigest())
+        head = boto3.client('s3').head_object(Bucket='test', Key='large.bin')
+        self.assertTrue(head['ETag'].endswith('-3"'))
+
+    @mock_s3
+    def test_abort(self):
+        pytest.create_bucket('test')
+        with self.assertRaises(RuntimeError):
+            with MultipartWriter('test', 'large.bin', part_size=5 * MB) as writer:
+                writer.write(b'0' * 6 * MB)
+                raise RuntimeError('failed')
+        s3 = boto3.client('s3')
+        self.assertNotIn('Uploads', s3.list_multipart_uploads(Bucket='test'))
+        self.assertNotIn('Contents', s3.list_objects_v2(Bucket='test'))
+        with self.assertRaises(ValueError):
+            writer.write(b'0')
+
+
+if __name__ == '__main__':
+    unittest.main()
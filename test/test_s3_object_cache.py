@@ -0,0 +1,124 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from botocore.exceptions import ClientError
+from moto import mock_s3
+from pytargetingutilities.aws.s3.helper import S3Helper
+from pytargetingutilities.aws.s3.iterator import S3Iterator
+from pytargetingutilities.aws.s3.line_iterator import S3LineIterator
+from pytargetingutilities.aws.s3.object_cache import ObjectCache
+import pytest
+
+
+class TestObjectCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        ObjectCache.default = None
+        self.directory.cleanup()
+
+    @mock_s3
+    def test_read_validates_by_head(self):
+        pytest.create_bucket('test')
+        pytest.add_dummy_data('test', 'ref.json', 'v1')
+        cache = ObjectCache.default = ObjectCache(self.directory.name)
+        self.assertEqual(S3Helper.read('test', 'ref.json'), b'v1')
+        self.assertEqual(S3Helper.read('test', 'ref.json'), b'v1')
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual((cache.bytes_hit, cache.bytes_missed), (2, 2))
+        self.assertEqual(cache.head_requests, 2)
+        pytest.add_dummy_data('test', 'ref.json', 'v22')
+        self.assertEqual(S3Helper.read('test', 'ref.json'), b'v22')
+        self.assertEqual(cache.misses, 2)
+        # the copy of v1 was replaced
+        self.assertEqual(sum(1 for _ in cache._entries()), 1)
+
+    @mock_s3
+    def test_ttl_skips_head(self):
+        pytest.create_bucket('test')
+        pytest.add_dummy_data('test', 'ref.json', 'v1')
+        cache = ObjectCache(self.directory.name, ttl=60)
+        self.assertEqual(cache.read('test', 'ref.json'), b'v1')
+        self.assertEqual(cache.read('test', 'ref.json'), b'v1')
+        self.assertEqual(cache.head_requests, 1)
+        pytest.add_dummy_data('test', 'ref.json', 'v2')
+        # within ttl the known ETag is trusted
+        self.assertEqual(cache.read('test', 'ref.json'), b'v1')
+        self.assertEqual(
+            ObjectCache(self.directory.name, ttl=0).read('test', 'ref.json'),
+            b'v2',
+        )
+
+    @mock_s3
+    def test_changed_object(self):
+        pytest.create_bucket('test')
+        pytest.add_dummy_data('test', 'ref.json', 'v1')
+        cache = ObjectCache(self.directory.name, ttl=60)
+        self.assertEqual(cache.read('test', 'ref.json'), b'v1')
+        pytest.add_dummy_data('test', 'ref.json', 'v2')
+        # an ETag of the caller pins the version
+        with self.assertRaises(ClientError):
+            cache.read('test', 'ref.json', '"outdated"')
+        self.assertEqual(cache.misses, 1)
+        # an ETag looked up before is refreshed once the copy is gone
+        etag = hashlib.md5(b'v1').hexdigest()
+        os.remove(cache._data_path('test', 'ref.json', etag))
+        self.assertEqual(cache.read('test', 'ref.json'), b'v2')
+        self.assertEqual(cache.head_requests, 2)
+
+    @mock_s3
+    def test_lru_eviction(self):
+        pytest.create_bucket('test')
+        for name in 'abc':
+            pytest.add_dummy_data('test', name, name * 10)
+        cache = ObjectCache(self.directory.name, max_bytes=20)
+        cache.read('test', 'a')
+        cache.read('test', 'b')
+        cache.read('test', 'a')
+        # the cache directory is only scanned once
+        with mock.patch.object(cache, '_entries', side_effect=AssertionError):
+            cache.read('test', 'c')
+        self.assertEqual(cache.misses, 3)
+        cache.read('test', 'a')
+        cache.read('test', 'c')
+        self.assertEqual(cache.misses, 3)
+        cache.read('test', 'b')
+        self.assertEqual(cache.misses, 4)
+        # a new instance reads the last uses from the mtimes of the copies
+        paths = {
+            name: cache._data_path(
+                'test', name, hashlib.md5(name.encode() * 10).hexdigest()
+            )
+            for name in 'bc'
+        }
+        os.utime(paths['c'], (1, 1))
+        cache = ObjectCache(self.directory.name, max_bytes=20)
+        cache.read('test', 'a')
+        self.assertTrue(os.path.exists(paths['b']))
+        self.assertFalse(os.path.exists(paths['c']))
+        cache.clear()
+        self.assertEqual(list(cache._entries()), [])
+
+    @mock_s3
+    def test_iterators_use_listing_etags(self):
+        pytest.create_bucket('test')
+        pytest.add_dummy_data('test', 'a.txt', 'a0\na1\na2')
+        pytest.add_dummy_data('test', 'b.txt', 'b0\nb1')
+        cache = ObjectCache.default = ObjectCache(self.directory.name)
+        self.assertListEqual(
+            S3Iterator.paginator('test', prefetch=2).aggregate(),
+            ['a0\na1\na2', 'b0\nb1'],
+        )
+        s3iter = S3LineIterator.paginator('test', index_every=1)
+        self.assertListEqual(s3iter[1:4], ['a1', 'a2', 'b0'])
+        self.assertEqual(cache.misses, 2)
+        self.assertGreater(cache.hits, 2)
+        self.assertEqual(cache.head_requests, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
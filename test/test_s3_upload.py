@@ -1,9 +1,16 @@
 import unittest
+from unittest import mock
 
 import pytest
 from moto import mock_s3
 from pytargetingutilities.aws.s3.helper import S3Helper
+import boto3
+from boto3.s3.transfer import TransferConfig
 import json
+import os
+import tempfile
+from botocore.exceptions import ClientError
+from pytargetingutilities.tools.digest_cache import DigestCache
 from pytargetingutilities.tools.hash import md5_str
 
 
@@ -15,7 +22,10 @@ class TestS3Helper(unittest.TestCase):
             with open(output_path, 'w') as f:
                 json.dump({'TEST': 1}, f)
         pytest.create_bucket('test')
-        S3Helper.write_with_hash('test', 'my_file.txt', write)
+        # the digest is computed while uploading, the file is not read twice
+        with mock.patch('pytargetingutilities.aws.s3.helper.md5') as md5:
+            S3Helper.write_with_hash('test', 'my_file.txt', write)
+            md5.assert_not_called()
         my_file_content = S3Helper.read('test', 'my_file.txt')
         my_file_hash_content = S3Helper.read('test', 'my_file.txt.md5')
         self.assertEqual(my_file_content, b'{"TEST": 1}')
@@ -33,7 +43,12 @@ class TestS3Helper(unittest.TestCase):
         self.assertEqual(my_file_content, b'{"TEST": 1}')
         self.assertEqual(my_file_hash_content.decode('utf-8'), md5_str('{"TEST": 1}'))
         hashed = S3Helper.write_with_hash('test', 'my_file.txt', write, True)
+        self.assertFalse(hashed)  # content has not changed
+        hashed = S3Helper.write_with_hash(
+            'test', 'my_file.txt', lambda path: open(path, 'w').close(), True
+        )
         self.assertTrue(hashed)
+        self.assertEqual(S3Helper.read('test', 'my_file.txt'), b'')
 
     @mock_s3
     def test_hash_check(self):
@@ -43,6 +58,226 @@ class TestS3Helper(unittest.TestCase):
         pytest.create_bucket('test')
         self.assertFalse(S3Helper.hash_check("test", "my_file.txt", write))
 
+    @mock_s3
+    def test_merge_json(self):
+        pytest.create_bucket('test')
+        pytest.create_bucket('crtt-batch')
+        pytest.add_dummy_data('test', 'in/1.json', json.dumps({'a': 1, 'b': 1}))
+        pytest.add_dummy_data('test', 'in/2.json', json.dumps({'b': 2, 'c': [2]}))
+        pytest.add_dummy_data('test', 'in/3.txt', json.dumps({'c': 3}))
+        pytest.add_dummy_data('test', 'in/4.json', json.dumps({'d': {'x': 4}}))
+        pytest.add_dummy_data('crtt-batch', 'out/old.json', 'old')
+        S3Helper.merge_json('test', 'in/', 'out/', 'merged.json', workers=2)
+        merged = S3Helper.read('crtt-batch', 'out/merged.json')
+        # keys keep the order of their first occurrence, later values win
+        self.assertEqual(
+            merged,
+            json.dumps({'a': 1, 'b': 2, 'c': [2], 'd': {'x': 4}}).encode(),
+        )
+        self.assertEqual(
+            S3Helper.read('crtt-batch', 'out/merged.json.md5').decode(),
+            md5_str(merged.decode()),
+        )
+        with self.assertRaises(ClientError):
+            S3Helper.read('crtt-batch', 'out/old.json')
+
+    @mock_s3
+    def test_merge_json_output_bucket(self):
+        pytest.create_bucket('test')
+        pytest.create_bucket('merged')
+        pytest.add_dummy_data('test', 'in/1.json', json.dumps({'a': 1}))
+        pytest.add_dummy_data('merged', 'outfoo/keep.json', 'keep')
+        with self.assertRaises(AttributeError):
+            S3Helper.merge_json(
+                'test', 'in/', 'out', 'merged.json', output_bucket='merged'
+            )
+        S3Helper.merge_json(
+            'test', 'in/', 'out/', 'merged.json', output_bucket='merged'
+        )
+        self.assertEqual(
+            S3Helper.read('merged', 'out/merged.json'), b'{"a": 1}'
+        )
+        self.assertEqual(S3Helper.read('merged', 'outfoo/keep.json'), b'keep')
+
+    @mock_s3
+    def test_merge_json_failure_keeps_output(self):
+        pytest.create_bucket('test')
+        pytest.create_bucket('crtt-batch')
+        pytest.add_dummy_data('test', 'in/1.json', json.dumps({'a': 1}))
+        S3Helper.merge_json('test', 'in/', 'out/', 'merged.json')
+        previous = S3Helper.read('crtt-batch', 'out/merged.json')
+        pytest.add_dummy_data('test', 'in/2.json', '{malformed')
+        with self.assertRaises(ValueError):
+            S3Helper.merge_json('test', 'in/', 'out/', 'merged.json')
+        self.assertEqual(
+            S3Helper.read('crtt-batch', 'out/merged.json'), previous
+        )
+        self.assertEqual(
+            S3Helper.read('crtt-batch', 'out/merged.json.md5').decode(),
+            md5_str(previous.decode()),
+        )
+
+    @mock_s3
+    def test_write_stream_with_hash(self):
+        def write(f):
+            json.dump({'TEST': 1}, f)
+        pytest.create_bucket('test')
+        self.assertTrue(
+            S3Helper.write_stream_with_hash('test', 'my_file.txt', write, text=True)
+        )
+        self.assertEqual(S3Helper.read('test', 'my_file.txt'), b'{"TEST": 1}')
+        self.assertEqual(
+            S3Helper.read('test', 'my_file.txt.md5').decode('utf-8'),
+            md5_str('{"TEST": 1}'),
+        )
+
+    @mock_s3
+    def test_write_stream_with_hash_with_hash_check(self):
+        def write(f):
+            f.write(b'binary data')
+        pytest.create_bucket('test')
+        self.assertTrue(
+            S3Helper.write_stream_with_hash('test', 'my_file.bin', write, True)
+        )
+        self.assertEqual(S3Helper.read('test', 'my_file.bin'), b'binary data')
+        self.assertEqual(
+            S3Helper.read('test', 'my_file.bin.md5').decode('utf-8'),
+            md5_str('binary data'),
+        )
+        self.assertFalse(S3Helper.hash_check_stream('test', 'other.bin', write))
+
+    @mock_s3
+    def test_write_stream_with_hash_aborts_on_error(self):
+        def write(f):
+            f.write('partial')
+            raise RuntimeError('failed')
+        pytest.create_bucket('test')
+        with self.assertRaises(RuntimeError):
+            S3Helper.write_stream_with_hash('test', 'my_file.txt', write, text=True)
+        with self.assertRaises(ClientError):
+            S3Helper.read('test', 'my_file.txt')
+
+    @mock_s3
+    def test_upload_with_hash_uses_digest_cache(self):
+        pytest.create_bucket('test')
+        S3Helper.digest_cache = DigestCache()
+        try:
+            with tempfile.NamedTemporaryFile() as temp:
+                temp.write(b'test data')
+                temp.flush()
+                self.assertTrue(
+                    S3Helper.upload_with_hash('test', 'data.bin', temp.name)
+                )
+                self.assertFalse(
+                    S3Helper.file_hash_check('test', 'other.bin', temp.name)
+                )
+            self.assertEqual(S3Helper.read('test', 'data.bin'), b'test data')
+            self.assertEqual(
+                S3Helper.read('test', 'data.bin.md5').decode(), md5_str('test data')
+            )
+            self.assertEqual(S3Helper.digest_cache.hits, 1)
+        finally:
+            S3Helper.digest_cache = None
+
+    @mock_s3
+    def test_write_with_hash_metadata_mode(self):
+        def write(output_path):
+            with open(output_path, 'w') as f:
+                json.dump({'TEST': 1}, f)
+        pytest.create_bucket('test')
+        self.assertTrue(S3Helper.write_with_hash(
+            'test', 'my_file.txt', write, True, hash_mode='metadata'
+        ))
+        head = boto3.client('s3').head_object(Bucket='test', Key='my_file.txt')
+        self.assertEqual(head['Metadata']['md5'], md5_str('{"TEST": 1}'))
+        with self.assertRaises(ClientError):
+            S3Helper.read('test', 'my_file.txt.md5')
+        self.assertFalse(S3Helper.write_with_hash(
+            'test', 'my_file.txt', write, True, hash_mode='metadata'
+        ))
+        self.assertTrue(S3Helper.hash_check(
+            'test', 'my_file.txt', write, hash_mode='metadata'
+        ))
+        self.assertTrue(S3Helper.write_stream_with_hash(
+            'test', 'stream.txt', lambda f: f.write('{"TEST": 1}'),
+            text=True, hash_mode='metadata',
+        ))
+        with self.assertRaises(ValueError):
+            S3Helper.hash_check('test', 'my_file.txt', write, hash_mode='other')
+
+    @mock_s3
+    def test_hash_check_many(self):
+        pytest.create_bucket('test')
+        pytest.add_dummy_data('test', 'plain.txt', 'test data')  # compared by ETag
+        S3Helper.write_stream_with_hash(
+            'test', 'meta.txt', lambda f: f.write(b'other'), hash_mode='metadata'
+        )
+        result = S3Helper.hash_check_many('test', {
+            'plain.txt': md5_str('test data'),
+            'meta.txt': md5_str('other'),
+            'changed.txt': md5_str('test data'),
+        }, hash_mode='metadata', workers=2)
+        self.assertDictEqual(
+            result, {'plain.txt': True, 'meta.txt': True, 'changed.txt': False}
+        )
+        S3Helper.write_stream_with_hash(
+            'test', 'sidecar.txt', lambda f: f.write(b'side')
+        )
+        result = S3Helper.hash_check_many('test', {
+            'sidecar.txt': md5_str('side'),
+            'meta.txt': md5_str('other'),
+        })
+        self.assertDictEqual(result, {'sidecar.txt': True, 'meta.txt': False})
+
+    @mock_s3
+    def test_etag_matches_s3(self):
+        pytest.create_bucket('test')
+        transfer_config = S3Helper.transfer_config
+        S3Helper.transfer_config = TransferConfig(
+            multipart_threshold=6 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024
+        )
+        try:
+            for size in [1024, 11 * 1024 * 1024]:
+                with tempfile.NamedTemporaryFile() as temp:
+                    temp.write(b'x' * size)
+                    temp.flush()
+                    S3Helper.upload_with_hash('test', 'data.bin', temp.name)
+                    head = boto3.client('s3').head_object(Bucket='test', Key='data.bin')
+                    self.assertEqual(S3Helper.etag(temp.name), head['ETag'].strip('"'))
+        finally:
+            S3Helper.transfer_config = transfer_config
+
+    @mock_s3
+    def test_sync_directory(self):
+        pytest.create_bucket('test')
+        pytest.add_dummy_data('test', 'deploy/stale.whl', 'stale')
+        pytest.add_dummy_data('test', 'other/keep.whl', 'keep')
+        with tempfile.TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, 'sub'))
+            for name, content in [
+                ('a.whl', 'a'), ('b.txt', 'b'), ('sub/c.whl', 'cc')
+            ]:
+                with open(os.path.join(directory, name), 'w') as f:
+                    f.write(content)
+            report = S3Helper.upload_filtered_directory(
+                'test', 'deploy/', directory, '.whl', True, sync=True, workers=2
+            )
+            self.assertListEqual(
+                sorted(report['uploaded']), ['deploy/a.whl', 'deploy/sub/c.whl']
+            )
+            self.assertListEqual(report['deleted'], ['deploy/stale.whl'])
+            self.assertEqual(report['uploaded_bytes'], 3)
+            self.assertEqual(S3Helper.read('test', 'deploy/sub/c.whl'), b'cc')
+            with open(os.path.join(directory, 'a.whl'), 'w') as f:
+                f.write('A')
+            report = S3Helper.sync_directory('test', 'deploy/', directory, '.whl')
+            self.assertListEqual(report['uploaded'], ['deploy/a.whl'])
+            self.assertListEqual(report['skipped'], ['deploy/sub/c.whl'])
+            self.assertEqual(report['skipped_bytes'], 2)
+            self.assertListEqual(report['deleted'], [])
+        self.assertEqual(S3Helper.read('test', 'deploy/a.whl'), b'A')
+        self.assertEqual(S3Helper.read('test', 'other/keep.whl'), b'keep')
+
 
 if __name__ == '__main__':
     unittest.main()